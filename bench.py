@@ -0,0 +1,509 @@
+"""Benchmarks for PDFToolz.
+
+Every benchmark builds its own deterministic synthetic PDFs with PyMuPDF,
+so runs need no sample files and are comparable between machines and
+commits. Results are printed as JSON.
+
+    python bench.py tools [--tools merge,ppt] [--docs text-20] [--repeat 5] [--output run.json]
+    python bench.py prefilter [--pages 200]
+    python bench.py load [--servers dev,gunicorn] [--concurrency 8] [--duration 10]
+    python bench.py startup [--repeat 5]
+    python bench.py upload [--size 200]
+    python bench.py compare old.json new.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import socket
+import tempfile
+import threading
+import time
+
+import fitz  # PyMuPDF
+
+import pdftoolz
+
+LOREM = ("Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+         "tempor incididunt ut labore et dolore magna aliqua").split()
+
+def add_text_page(doc, rng):
+    page = doc.new_page()
+    y = 72
+    while y < page.rect.height - 72:
+        line = " ".join(rng.choice(LOREM) for _ in range(12))
+        page.insert_text((72, y), line, fontsize=10)
+        y += 14
+    return page
+
+def add_table_page(doc, rng, rows=12, cols=5):
+    page = doc.new_page()
+    page.insert_text((72, 60), "Statement of accounts", fontsize=14)
+    left, top, width, height = 72, 90, 90, 18
+    for r in range(rows + 1):
+        page.draw_line((left, top + r * height), (left + cols * width, top + r * height))
+    for c in range(cols + 1):
+        page.draw_line((left + c * width, top), (left + c * width, top + rows * height))
+    for r in range(rows):
+        for c in range(cols):
+            value = f"{rng.randint(0, 99999) / 100:.2f}" if c else rng.choice(LOREM)
+            page.insert_text((left + c * width + 4, top + r * height + 13), value, fontsize=9)
+    return page
+
+def add_drawing_page(doc, rng):
+    """Text with rulings that are not tables: underlines, a chart, a curve."""
+    page = add_text_page(doc, rng)
+    page.draw_line((72, 50), (540, 50))
+    for _ in range(5):
+        page.draw_line((rng.randint(72, 500), rng.randint(400, 700)), (rng.randint(72, 500), rng.randint(400, 700)))
+    page.draw_bezier((100, 300), (150, 250), (250, 350), (300, 300))
+    return page
+
+def add_image_page(doc, rng, images=4):
+    """Page of scanned-photo style raster images stored losslessly."""
+    page = doc.new_page()
+    canvas = fitz.open()
+    for n in range(images):
+        scratch = canvas.new_page(width=400, height=300)
+        for _ in range(30):
+            color = (rng.random(), rng.random(), rng.random())
+            x, y = rng.randint(0, 400), rng.randint(0, 300)
+            scratch.draw_circle((x, y), rng.randint(10, 120), color=color, fill=color)
+        pix = scratch.get_pixmap(dpi=150)
+        column, row = n % 2, n // 2
+        rect = fitz.Rect(50 + column * 260, 60 + row * 200, 300 + column * 260, 247 + row * 200)
+        page.insert_image(rect, pixmap=pix)
+    canvas.close()
+    return page
+
+PAGE_KINDS = {
+    "text": add_text_page,
+    "table": add_table_page,
+    "drawing": add_drawing_page,
+    "image": add_image_page,
+}
+
+# Named documents for the tool benchmark: page count and page mix
+CORPUS = {
+    "text-20": ["text"] * 20,
+    "text-200": ["text"] * 200,
+    "tables-30": ["table", "text"] * 15,
+    "images-10": ["image"] * 10,
+    "mixed-60": ["text", "table", "image", "drawing"] * 15,
+}
+DEFAULT_DOCS = ["text-20", "tables-30", "images-10", "mixed-60"]
+
+def make_pdf(path, kinds, seed=0):
+    """Write a PDF whose pages follow the given list of page kinds."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for kind in kinds:
+        PAGE_KINDS[kind](doc, rng)
+    doc.save(path)
+    doc.close()
+    return path
+
+def bench_prefilter(args, workdir):
+    """Table extraction with and without the PyMuPDF pre-filter."""
+    # Mostly prose, like real statements: one page in five holds a table
+    kinds = [("table" if n % 5 == 0 else "drawing" if n % 5 == 1 else "text") for n in range(args.pages)]
+    path = make_pdf(os.path.join(workdir, "prefilter.pdf"), kinds)
+    pages = list(range(len(kinds)))
+
+    timings = {}
+    results = {}
+    for prefilter in (False, True):
+        start = time.perf_counter()
+        results[prefilter] = pdftoolz._extract_tables(path, pages, prefilter)
+        timings[prefilter] = time.perf_counter() - start
+
+    return {
+        "benchmark": "prefilter",
+        "pages": len(pages),
+        "table_pages": kinds.count("table"),
+        "candidate_pages": sum(pdftoolz.may_have_table(page) for page in fitz.open(path)),
+        "seconds_full": round(timings[False], 3),
+        "seconds_prefilter": round(timings[True], 3),
+        "speedup": round(timings[False] / timings[True], 2),
+        "identical": results[False] == results[True],
+    }
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def run_tool(client, tool, path, options):
+    """Submit one file to a tool through the app and wait for its output."""
+    data = dict(options)
+    with open(path, 'rb') as f, open(path, 'rb') as g:
+        if tool == "merge":
+            # Merge needs two inputs: the document twice
+            data['files'] = [(f, "a.pdf"), (g, "b.pdf")]
+        else:
+            data['file'] = (f, "in.pdf")
+        reply = client.post(f"/{tool}", data=data, content_type='multipart/form-data').get_json()
+    while reply.get('job') or reply.get('status') in ("queued", "running"):
+        time.sleep(0.02)
+        reply = client.get(f"/jobs/{reply.get('job') or reply['id']}").get_json()
+    if 'url' not in reply:
+        raise RuntimeError(f"{tool} failed: {reply.get('error')}")
+    response = client.get(reply['url'])
+    size = len(response.data)
+    response.close()
+    return size
+
+def measure_case(tool, path, repeat, options):
+    """Time one tool on one document; runs in its own process (--case).
+
+    A fresh process per case keeps ru_maxrss meaningful: the web process and
+    its job workers only ever handled this case. The result cache is off so
+    every repeat does the full work, and a first untimed run starts the
+    worker processes.
+    """
+    pdftoolz.app.config['RESULT_CACHE_ENABLED'] = False
+    client = pdftoolz.app.test_client()
+    pages = len(fitz.open(path))
+    run_tool(client, tool, path, options)
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output_bytes = run_tool(client, tool, path, options)
+        latencies.append(time.perf_counter() - start)
+    pdftoolz.jobs.shutdown()
+    p50 = percentile(latencies, 0.5)
+    return {
+        "latency_p50": round(p50, 4),
+        "latency_p95": round(percentile(latencies, 0.95), 4),
+        "pages_per_sec": round(pages * (2 if tool == "merge" else 1) / p50, 2),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_worker_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        "input_bytes": os.path.getsize(path),
+        "output_bytes": output_bytes,
+    }
+
+def bench_tools(args, workdir):
+    """Latency, throughput, memory and output size of every tool."""
+    tools = args.tools.split(',') if args.tools else list(pdftoolz.TOOL_RUNNERS)
+    docs = args.docs.split(',') if args.docs else DEFAULT_DOCS
+    options = json.loads(args.options) if args.options else {}
+    cases = []
+    for doc in docs:
+        path = make_pdf(os.path.join(workdir, f"{doc}.pdf"), CORPUS[doc])
+        for tool in tools:
+            command = [sys.executable, os.path.abspath(__file__), "--case", tool, path,
+                       "--repeat", str(args.repeat), "--options", json.dumps(options)]
+            # Each case gets its own uploads/ and downloads/
+            rundir = tempfile.mkdtemp(dir=workdir)
+            child = subprocess.run(command, capture_output=True, text=True, cwd=rundir)
+            if child.returncode != 0:
+                case = {"error": child.stderr.strip().splitlines()[-1:]}
+            else:
+                case = json.loads(child.stdout.strip().splitlines()[-1])
+            case.update(tool=tool, doc=doc, pages=len(CORPUS[doc]))
+            print(f"{tool:>9} {doc:>10}: {case.get('latency_p50', '-')}s p50", file=sys.stderr)
+            cases.append(case)
+    return {
+        "benchmark": "tools",
+        "repeat": args.repeat,
+        "options": options,
+        "environment": {
+            "python": platform.python_version(),
+            "pymupdf": fitz.VersionBind,
+            "cpus": os.cpu_count(),
+            "job_workers": pdftoolz.app.config['JOB_WORKERS'],
+            "page_workers": pdftoolz.app.config['PAGE_WORKERS'],
+        },
+        "cases": cases,
+    }
+
+def compare(old_path, new_path):
+    """Per-case change in p50 latency and peak RSS between two tool runs."""
+    with open(old_path) as f:
+        old = {(c['tool'], c['doc']): c for c in json.load(f)['cases']}
+    with open(new_path) as f:
+        new = {(c['tool'], c['doc']): c for c in json.load(f)['cases']}
+    rows = []
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        if 'latency_p50' not in before or 'latency_p50' not in after:
+            continue
+        rows.append({
+            "tool": key[0],
+            "doc": key[1],
+            "latency_p50_change": round(after['latency_p50'] / before['latency_p50'] - 1, 3),
+            "peak_rss_change": round(after['peak_rss_kb'] / before['peak_rss_kb'] - 1, 3),
+            "output_bytes_change": round(after['output_bytes'] / max(1, before['output_bytes']) - 1, 3),
+        })
+    return {"benchmark": "compare", "old": old_path, "new": new_path, "cases": rows}
+
+def server_command(server, port):
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    if server == "dev":
+        return [sys.executable, os.path.join(app_dir, "pdftoolz.py")]
+    return [sys.executable, "-m", "gunicorn", "-c", os.path.join(app_dir, "gunicorn_conf.py"),
+            "--pythonpath", app_dir, "-b", f"127.0.0.1:{port}", "--access-logfile", os.devnull, "pdftoolz:app"]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def hammer(port, path, concurrency, duration):
+    """GET path from concurrency threads for duration seconds."""
+    latencies = []
+    errors = 0
+    received = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        nonlocal errors, received
+        conn = None
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if conn is None:
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                conn.request("GET", path)
+                response = conn.getresponse()
+                size = len(response.read())
+                ok = response.status == 200
+                if response.getheader("Connection", "").lower() == "close" or response.version == 10:
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException):
+                ok, size = False, 0
+                conn = None
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                    received += size
+                else:
+                    errors += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    return {
+        "path": path,
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "mb_per_sec": round(received / elapsed / 1024**2, 1),
+        "latency_p50": round(percentile(latencies, 0.5), 4) if latencies else None,
+        "latency_p95": round(percentile(latencies, 0.95), 4) if latencies else None,
+    }
+
+def bench_load(args, workdir):
+    """Requests/sec of the page and a download on each server.
+
+    Each server runs from its own directory holding one sample output, so
+    /download exercises send_file (and sendfile() under gunicorn).
+    """
+    cases = []
+    for server in args.servers.split(','):
+        if server not in ("dev", "gunicorn"):
+            raise SystemExit(f"Unknown server: {server}")
+        rundir = tempfile.mkdtemp(dir=workdir)
+        os.makedirs(os.path.join(rundir, "downloads"))
+        sample = make_pdf(os.path.join(rundir, "downloads", "sample.pdf"), CORPUS[(args.docs or "text-20").split(",")[0]])
+        port = free_port()
+        env = dict(os.environ, PDFTOOLZ_PORT=str(port))
+        proc = subprocess.Popen(server_command(server, port), cwd=rundir, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            for _ in range(600):
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                    break
+                except OSError:
+                    if proc.poll() is not None:
+                        raise SystemExit(f"{server} server exited with {proc.returncode}")
+                    time.sleep(0.1)
+            for path in ("/", "/download/sample.pdf"):
+                case = hammer(port, path, args.concurrency, args.duration)
+                case.update(server=server)
+                print(f"{server:>9} {path}: {case['requests_per_sec']} req/s", file=sys.stderr)
+                cases.append(case)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    return {
+        "benchmark": "load",
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "download_bytes": os.path.getsize(sample),
+        "cases": cases,
+    }
+
+STARTUP_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import pdftoolz
+imported = time.perf_counter()
+pdftoolz.warm_up(sys.argv[1:])
+print(json.dumps({
+    "import_seconds": imported - start,
+    "warm_up_seconds": time.perf_counter() - imported,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+def bench_startup(args, workdir):
+    """Import time and RSS of a fresh worker, bare and with converters loaded.
+
+    "app" is what a job or page worker now pays at start; "all" loads every
+    converter, as importing the app used to. Medians over --repeat runs.
+    """
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=app_dir + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    scenarios = {"app": []}
+    scenarios.update((tool, [tool]) for tool in pdftoolz.TOOL_IMPORTS)
+    scenarios["all"] = list(pdftoolz.TOOL_IMPORTS)
+    cases = []
+    for name, tools in scenarios.items():
+        runs = []
+        for _ in range(args.repeat):
+            child = subprocess.run([sys.executable, "-c", STARTUP_PROBE, *tools], cwd=workdir, env=env,
+                                   capture_output=True, text=True, check=True)
+            runs.append(json.loads(child.stdout.strip().splitlines()[-1]))
+        case = {"scenario": name, "tools": tools}
+        for key in ("import_seconds", "warm_up_seconds", "rss_kb"):
+            value = percentile([run[key] for run in runs], 0.5)
+            case[key] = round(value, 4) if isinstance(value, float) else value
+        case["startup_seconds"] = round(case["import_seconds"] + case["warm_up_seconds"], 4)
+        print(f"{name:>9}: {case['startup_seconds']}s, {case['rss_kb'] // 1024} MB", file=sys.stderr)
+        cases.append(case)
+    return {"benchmark": "startup", "repeat": args.repeat, "cases": cases}
+
+UPLOAD_PROBE = """
+import json, os, resource, sys
+from werkzeug.test import EnvironBuilder
+import pdftoolz
+
+class MultipartBody:
+    \"\"\"A one-file multipart body generated on the fly, never held whole.\"\"\"
+
+    def __init__(self, size, boundary):
+        self.head = (f"--{boundary}\\r\\nContent-Disposition: form-data; name=\\"file\\"; filename=\\"big.pdf\\"\\r\\n"
+                     "Content-Type: application/pdf\\r\\n\\r\\n%PDF-1.7\\n").encode()
+        self.tail = f"\\r\\n--{boundary}--\\r\\n".encode()
+        self.padding = size - len(b"%PDF-1.7\\n")
+        self.length = len(self.head) + self.padding + len(self.tail)
+        self.sent = 0
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self.length - self.sent
+        out = bytearray()
+        while len(out) < n and self.sent < self.length:
+            offset = self.sent
+            if offset < len(self.head):
+                piece = self.head[offset:offset + n - len(out)]
+            elif offset < len(self.head) + self.padding:
+                piece = b"x" * min(n - len(out), len(self.head) + self.padding - offset)
+            else:
+                start = offset - len(self.head) - self.padding
+                piece = self.tail[start:start + n - len(out)]
+            out += piece
+            self.sent += len(piece)
+        return bytes(out)
+
+    def readline(self, limit=-1):
+        return self.read(limit if limit and limit > 0 else 64 * 1024)
+
+size = int(sys.argv[1])
+body = MultipartBody(size, "benchboundary")
+environ = EnvironBuilder(path="/compress", method="POST").get_environ()
+environ.update({"wsgi.input": body, "CONTENT_LENGTH": str(body.length),
+                "CONTENT_TYPE": "multipart/form-data; boundary=benchboundary"})
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+with pdftoolz.app.request_context(environ):
+    path = pdftoolz.ingest_upload(pdftoolz.request.files["file"])
+print(json.dumps({
+    "rss_before_kb": before,
+    "rss_after_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "stored_bytes": os.path.getsize(path),
+}))
+"""
+
+def bench_upload(args, workdir):
+    """Peak RSS while a large multipart upload is parsed and ingested.
+
+    A fresh process streams --size MB through UploadRequest and
+    ingest_upload() from a body generated on the fly. The RSS growth must
+    stay well under the upload size, or the run fails.
+    """
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=app_dir + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    size = args.size * 1024**2
+    child = subprocess.run([sys.executable, "-c", UPLOAD_PROBE, str(size)], cwd=workdir, env=env,
+                           capture_output=True, text=True, check=True)
+    run = json.loads(child.stdout.strip().splitlines()[-1])
+    growth_kb = run["rss_after_kb"] - run["rss_before_kb"]
+    result = {
+        "benchmark": "upload",
+        "upload_bytes": size,
+        "stored_bytes": run["stored_bytes"],
+        "peak_rss_kb": run["rss_after_kb"],
+        "rss_growth_kb": growth_kb,
+        # Generous: chunked parsing needs a few MB, a buffered body needs it all
+        "bounded": run["stored_bytes"] == size and growth_kb * 1024 < size / 10,
+    }
+    if not result["bounded"]:
+        raise SystemExit(f"Upload of {args.size} MB grew RSS by {growth_kb // 1024} MB: {json.dumps(result)}")
+    return result
+
+BENCHMARKS = {
+    "tools": bench_tools,
+    "prefilter": bench_prefilter,
+    "load": bench_load,
+    "startup": bench_startup,
+    "upload": bench_upload,
+}
+
+def main():
+    if sys.argv[1:2] == ["--case"]:
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--case", nargs=2, metavar=("TOOL", "PDF"))
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--options", default="{}")
+        args = parser.parse_args()
+        print(json.dumps(measure_case(*args.case, args.repeat, json.loads(args.options))))
+        return
+    if sys.argv[1:2] == ["compare"]:
+        print(json.dumps(compare(*sys.argv[2:4]), indent=2))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--pages", type=int, default=200, help="pages in the synthetic document (prefilter)")
+    parser.add_argument("--tools", help="comma-separated tool ids (default: all)")
+    parser.add_argument("--docs", help=f"comma-separated corpus documents from {', '.join(CORPUS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per tool and document")
+    parser.add_argument("--options", help="JSON object of form options sent with every request")
+    parser.add_argument("--servers", default="dev,gunicorn", help="servers to load test (load)")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients (load)")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per load test case (load)")
+    parser.add_argument("--size", type=int, default=200, help="upload size in MB (upload)")
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        result = BENCHMARKS[args.benchmark](args, workdir)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Gunicorn settings for serving PDFToolz in production.
+
+    gunicorn -c gunicorn_conf.py pdftoolz:app
+
+The tools never run in the web process: jobs go to the app's own pool of
+JOB_WORKERS processes, and page-level work fans out from there. So the web
+side only parses uploads, answers status polls and streams downloads, which
+is I/O-bound work for threads. It must also be a single process, because the
+job table and the queue live in its memory; a second worker would not know
+the first one's jobs. Scale the tools with PDFTOOLZ_JOB_WORKERS and
+PDFTOOLZ_PAGE_WORKERS, and request concurrency with PDFTOOLZ_THREADS.
+"""
+import os
+
+bind = os.environ.get('PDFTOOLZ_BIND', '0.0.0.0:5000')
+workers = 1
+worker_class = 'gthread'
+threads = int(os.environ.get('PDFTOOLZ_THREADS', 32))
+
+# Import the app and PyMuPDF once in the master before forking, so a
+# (re)started worker is ready immediately. The converters (pandas,
+# pdfplumber, pdf2docx, python-pptx) are only imported by the job workers
+# that run those tools; PDFTOOLZ_WARM_UP=word,excel,ppt loads them up front.
+preload_app = True
+
+# Large uploads can take a while on slow links
+timeout = 300
+graceful_timeout = 30
+keepalive = 5
+# Downloads leave through sendfile(); the default, stated for clarity
+sendfile = True
+# Heartbeat file on tmpfs so a slow disk can't stall the worker
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    # The reaper thread and the job pool are created lazily, so nothing
+    # runs in the master; start the reaper now rather than on the first request.
+    import pdftoolz
+    pdftoolz.reaper.start()
+
+
+def worker_exit(server, worker):
+    # Stop the job processes with the web worker instead of orphaning them
+    import pdftoolz
+    pdftoolz.jobs.shutdown()
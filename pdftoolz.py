@@ -1,24 +1,140 @@
-from flask import Flask, render_template_string, request, send_file, jsonify
+from flask import Flask, Request, Response, render_template_string, request, send_file, jsonify
 from werkzeug.utils import secure_filename
 import fitz  # PyMuPDF
-import pdfplumber
-import pandas as pd
-from pdf2docx import Converter
-from pptx import Presentation
-from pptx.util import Inches
 import os
 import io
 import zipfile
+import sys
+import math
 import uuid
 import time
+import json
+import mimetypes
+import hashlib
+import importlib
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from collections import Counter, OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+class UploadRequest(Request):
+    """Request that streams uploaded files straight into uploads/.
+
+    Werkzeug keeps small parts in memory and spools large ones to the system
+    temp dir, after which file.save() copies them again. Here every file part
+    is written chunk by chunk into uploads/, so ingest_upload() can claim it
+    with a rename and peak memory does not depend on the upload size.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spooled_files = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = tempfile.NamedTemporaryFile('wb+', dir=app.config['UPLOAD_FOLDER'], prefix='spool_', delete=False)
+        self.spooled_files.append(stream.name)
+        return stream
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['DOWNLOAD_FOLDER'] = 'downloads'
 
+# Background job processing
+# At least 2, so the heavy conversions below can never hold every worker
+app.config['JOB_WORKERS'] = max(2, int(os.environ.get('PDFTOOLZ_JOB_WORKERS', os.cpu_count() or 2)))
+app.config['JOB_QUEUE_SIZE'] = int(os.environ.get('PDFTOOLZ_JOB_QUEUE_SIZE', 64))  # queued jobs before 429
+app.config['JOB_RETENTION'] = 3600  # seconds a finished job stays queryable
+app.config['JOB_START_METHOD'] = 'spawn'  # the web process is threaded, so don't fork it
+# Tools whose converters job workers import at start, e.g. "word,excel";
+# the rest are imported by the first job that needs them
+app.config['WARM_UP_TOOLS'] = [t for t in os.environ.get('PDFTOOLZ_WARM_UP', '').split(',') if t]
+# Conversions that can run for minutes. Each has its own limit and together they
+# leave a worker free so fast tools like organize are never starved.
+HEAVY_TOOLS = {"word", "excel", "ppt"}
+app.config['TOOL_CONCURRENCY'] = {tool: max(1, app.config['JOB_WORKERS'] // 2) for tool in HEAVY_TOOLS}
+app.config['HEAVY_JOB_LIMIT'] = max(1, app.config['JOB_WORKERS'] - 1)
+# Queued heavy jobs (heavy batches included) past this get a 429, so they
+# cannot fill the queue and turn fast tools away too
+app.config['HEAVY_QUEUE_SIZE'] = int(os.environ.get('PDFTOOLZ_HEAVY_QUEUE_SIZE',
+                                                    max(1, app.config['JOB_QUEUE_SIZE'] // 2)))
+# A batch job fans out over BATCH_WORKERS processes of its own (each file
+# runs single-process), so only one runs at a time; batches of heavy tools
+# also count against HEAVY_JOB_LIMIT
+app.config['TOOL_CONCURRENCY']['batch'] = 1
+app.config['BATCH_WORKERS'] = int(os.environ.get('PDFTOOLZ_BATCH_WORKERS', os.cpu_count() or 1))
+app.config['BATCH_MAX_FILES'] = 1000
+app.config['BATCH_MAX_BYTES'] = 2 * 1024**3  # uncompressed size of PDFs taken from ZIP uploads
+
+# Instrumentation
+app.config['PROFILING_ENABLED'] = os.environ.get('PDFTOOLZ_PROFILING') == '1'  # honour X-PDFToolz-Profile
+app.config['PROFILE_INTERVAL'] = 0.005  # seconds between stack samples
+
+# Results of earlier runs, keyed on input hash + tool + options
+app.config['RESULT_CACHE_ENABLED'] = True
+app.config['RESULT_CACHE_FOLDER'] = 'cache'
+app.config['RESULT_CACHE_MAX_BYTES'] = int(os.environ.get('PDFTOOLZ_RESULT_CACHE_MAX_BYTES', 2 * 1024**3))
+app.config['RESULT_CACHE_MAX_AGE'] = 24 * 3600  # seconds since last hit
+
+# Housekeeping for uploads/ and downloads/
+app.config['FILE_TTL'] = int(os.environ.get('PDFTOOLZ_FILE_TTL', 3600))  # seconds since last use
+app.config['DISK_QUOTA_BYTES'] = int(os.environ.get('PDFTOOLZ_DISK_QUOTA_BYTES', 5 * 1024**3))
+app.config['REAPER_INTERVAL'] = 60  # seconds between sweeps
+app.config['DELETE_AFTER_DOWNLOAD'] = False  # or per request with /download/<file>?delete=1
+# Behind nginx, hand downloads to it: set this to an internal location that
+# aliases downloads/, e.g. "/protected-downloads/". For Apache/lighttpd use
+# Flask's USE_X_SENDFILE instead. With either, files are not deleted on
+# download (DELETE_AFTER_DOWNLOAD is ignored); the reaper removes them.
+app.config['X_ACCEL_REDIRECT_PREFIX'] = os.environ.get('PDFTOOLZ_X_ACCEL_REDIRECT_PREFIX')
+app.config['USE_X_SENDFILE'] = os.environ.get('PDFTOOLZ_X_SENDFILE') == '1'
+
+# Resumable uploads sent in numbered chunks (/uploads)
+app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024**2
+app.config['CHUNKED_UPLOAD_THRESHOLD'] = 16 * 1024**2  # the web UI chunks files larger than this
+# Sessions reserve their declared size up front; past either limit new ones get a 429
+app.config['UPLOAD_MAX_SESSIONS'] = int(os.environ.get('PDFTOOLZ_UPLOAD_MAX_SESSIONS', 32))
+app.config['UPLOAD_MAX_RESERVED_BYTES'] = int(os.environ.get('PDFTOOLZ_UPLOAD_MAX_RESERVED_BYTES',
+                                                             app.config['DISK_QUOTA_BYTES'] // 2))
+
+# Page thumbnails for the organize tool
+app.config['PREVIEW_FOLDER'] = 'cache/previews'
+app.config['PREVIEW_MEMORY_BYTES'] = 32 * 1024**2
+app.config['PREVIEW_DISK_BYTES'] = int(os.environ.get('PDFTOOLZ_PREVIEW_DISK_BYTES', 256 * 1024**2))
+app.config['PREVIEW_OPEN_DOCS'] = 8  # documents kept open between thumbnail requests
+# Thumbnails of very tall pages are scaled down to at most this many widths
+# high, so a strip-shaped page cannot make a huge pixmap
+app.config['PREVIEW_MAX_ASPECT'] = 4
+
+# Page-parallel work inside a single job (ppt rendering, excel tables, compress
+# images). Up to JOB_WORKERS jobs can fan out at once, so by default they split
+# the CPUs between them instead of each spawning a process per CPU.
+app.config['PAGE_WORKERS'] = int(os.environ.get('PDFTOOLZ_PAGE_WORKERS',
+                                                max(1, (os.cpu_count() or 1) // app.config['JOB_WORKERS'])))
+app.config['RENDER_PAGES_PER_TASK'] = 8
+app.config['TABLE_PAGES_PER_TASK'] = 10
+app.config['WORD_WORKERS'] = app.config['PAGE_WORKERS']  # pdf2docx processes per word job
+app.config['WORD_PARALLEL_PAGES'] = 20  # word jobs this long convert in parallel
+app.config['TABLE_PREFILTER'] = True  # skip pdfplumber on pages without ruling lines
+app.config['MERGE_BATCH_PAGES'] = 200  # pages merged in memory before flushing to disk
+app.config['IMAGES_PER_TASK'] = 8  # images recompressed per compress worker task
+
+# Image handling per compression preset; "lossless" only rewrites the file
+COMPRESSION_PRESETS = {
+    "screen": {"dpi": 72, "quality": 40},
+    "ebook": {"dpi": 150, "quality": 60},
+    "print": {"dpi": 300, "quality": 80},
+}
+
 os.makedirs('uploads', exist_ok=True)
 os.makedirs('downloads', exist_ok=True)
+os.makedirs('cache', exist_ok=True)
+os.makedirs(app.config['PREVIEW_FOLDER'], exist_ok=True)
 
 HTML = """
 <!DOCTYPE html>
@@ -107,6 +223,9 @@ HTML = """
         <button onclick="removeFile()" class="text-red-600 text-sm mt-2 hover:underline">Remove all files</button>
       </div>
 
+      <!-- Page Previews (organize) -->
+      <div id="preview-grid" class="hidden mt-6 grid grid-cols-4 gap-3 max-h-96 overflow-y-auto p-1"></div>
+
       <!-- Options Form -->
       <form id="options-form" class="mt-6 space-y-4"></form>
 
@@ -128,6 +247,7 @@ HTML = """
       <div id="success-msg" class="hidden mt-4 p-4 bg-green-100 dark:bg-green-900 text-green-800 dark:text-green-200 rounded-xl text-center">
         <i class="ph ph-check-circle text-2xl mb-2"></i>
         <p>Processing complete! Click the download button above.</p>
+        <p id="result-note" class="text-sm mt-1"></p>
       </div>
     </div>
   </div>
@@ -136,6 +256,61 @@ HTML = """
     const tools = {{ tools|tojson }};
     let current_tool = null;
     let uploadedFiles = [];
+    let previewObserver = null;
+    let previewDoc = null;  // the server's copy of the previewed file, sent instead of the file
+
+    // Files above this go up in resumable chunks, several at a time
+    const CHUNKED_UPLOAD_THRESHOLD = {{ chunk_threshold }};
+    const PARALLEL_CHUNKS = 4;
+
+    async function sha256Hex(buffer) {
+      // crypto.subtle only exists on https and localhost; the server then checks lengths only
+      if (!window.crypto || !crypto.subtle) return null;
+      const digest = await crypto.subtle.digest('SHA-256', buffer);
+      return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function uploadChunked(file, onProgress) {
+      let res = await fetch('/uploads', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size })
+      });
+      const session = await res.json();
+      if (!res.ok) throw new Error(session.error || 'Upload failed');
+
+      const pending = [...Array(session.chunks).keys()];
+      let done = 0;
+      async function sendChunks() {
+        while (pending.length) {
+          const n = pending.shift();
+          const body = await file.slice(n * session.chunk_size, (n + 1) * session.chunk_size).arrayBuffer();
+          const headers = {};
+          const checksum = await sha256Hex(body);
+          if (checksum) headers['X-Chunk-SHA256'] = checksum;
+          for (let attempt = 1; ; attempt++) {
+            let r = null;
+            try {
+              r = await fetch('/uploads/' + session.id + '/' + n, { method: 'PUT', headers, body });
+            } catch (e) {
+              // Network error: retry below
+            }
+            if (r && r.ok) break;
+            if (r && r.status === 404) throw new Error('Upload expired, please try again');
+            if (attempt === 5) throw new Error('Upload failed after several attempts, please try again');
+            await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+          }
+          done++;
+          onProgress(done / session.chunks);
+        }
+      }
+      await Promise.all(Array.from({ length: Math.min(PARALLEL_CHUNKS, session.chunks) }, sendChunks));
+
+      res = await fetch('/uploads/' + session.id + '/complete', { method: 'POST' });
+      const data = await res.json();
+      if (!res.ok) throw new Error(data.error || 'Upload failed');
+      return data.upload;
+    }
 
     function openTool(id) {
       current_tool = tools.find(t => t.id === id);
@@ -168,6 +343,7 @@ HTML = """
       document.getElementById('file-input').value = '';
       document.getElementById('file-info').classList.add('hidden');
       document.getElementById('file-list').innerHTML = '';
+      clearPreviews();
       document.getElementById('download-link').classList.add('hidden');
       document.getElementById('success-msg').classList.add('hidden');
       document.getElementById('btn-text').textContent = 'Process PDF';
@@ -180,6 +356,71 @@ HTML = """
       document.getElementById('file-input').value = '';
       document.getElementById('file-info').classList.add('hidden');
       document.getElementById('file-list').innerHTML = '';
+      clearPreviews();
+    }
+
+    function clearPreviews() {
+      if (previewObserver) previewObserver.disconnect();
+      previewObserver = null;
+      previewDoc = null;
+      const grid = document.getElementById('preview-grid');
+      grid.innerHTML = '';
+      grid.classList.add('hidden');
+    }
+
+    async function loadPreviews(file) {
+      clearPreviews();
+      const form = new FormData();
+      if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+        // Large files take the resumable path here, and only here
+        const button = document.getElementById('process-btn');
+        button.disabled = true;
+        try {
+          form.append('upload', await uploadChunked(file, fraction => {
+            document.getElementById('btn-text').textContent = 'Uploading ' + Math.round(fraction * 100) + '%...';
+          }));
+        } catch (e) {
+          return;
+        } finally {
+          document.getElementById('btn-text').textContent = 'Process PDF';
+          button.disabled = false;
+        }
+      } else {
+        form.append('file', file);
+      }
+      const data = await (await fetch('/preview', { method: 'POST', body: form })).json();
+      // Another file may have been picked meanwhile
+      if (!data.doc || uploadedFiles[0] !== file) return;
+      previewDoc = data.doc;
+
+      // Thumbnails are only requested once they scroll into view
+      const grid = document.getElementById('preview-grid');
+      previewObserver = new IntersectionObserver(entries => {
+        for (const entry of entries) {
+          if (entry.isIntersecting) {
+            entry.target.src = entry.target.dataset.src;
+            previewObserver.unobserve(entry.target);
+          }
+        }
+      }, { root: grid, rootMargin: '200px' });
+
+      for (let n = 1; n <= data.pages; n++) {
+        const cell = document.createElement('button');
+        cell.type = 'button';
+        cell.title = 'Add page ' + n + ' to the page order';
+        cell.className = 'flex flex-col items-center gap-1 p-1 rounded-lg hover:bg-blue-100 dark:hover:bg-slate-700';
+        cell.innerHTML = `
+          <img data-src="/preview/${data.doc}/${n}?width=160" alt="Page ${n}" class="w-full bg-white border border-gray-200 dark:border-slate-600" style="aspect-ratio: ${data.width} / ${data.height}">
+          <span class="text-xs text-gray-500">${n}</span>
+        `;
+        cell.addEventListener('click', () => {
+          const order = document.querySelector('#options-form [name=order]');
+          order.value = order.value.trim() ? order.value.trim() + ',' + n : String(n);
+        });
+        grid.appendChild(cell);
+        previewObserver.observe(cell.querySelector('img'));
+      }
+      grid.classList.remove('hidden');
     }
 
     // Drag & Drop
@@ -241,6 +482,7 @@ HTML = """
       });
       
       document.getElementById('file-info').classList.remove('hidden');
+      if (current_tool.preview) loadPreviews(validFiles[0]);
     }
 
     document.getElementById('process-btn').addEventListener('click', async () => {
@@ -255,13 +497,17 @@ HTML = """
       }
       
       const form = new FormData();
-      
-      if (current_tool.multiple) {
-        for (let f of uploadedFiles) {
-          form.append('files', f);
+      const files = current_tool.multiple ? uploadedFiles : [uploadedFiles[0]];
+      // A previewed file is already on the server
+      const uploaded = !current_tool.multiple && previewDoc !== null;
+      const chunked = !uploaded && files.some(f => f.size > CHUNKED_UPLOAD_THRESHOLD);
+
+      if (uploaded) {
+        form.append('doc', previewDoc);
+      } else if (!chunked) {
+        for (let f of files) {
+          form.append(current_tool.multiple ? 'files' : 'file', f);
         }
-      } else {
-        form.append('file', uploadedFiles[0]);
       }
 
       // Get options from the form
@@ -278,14 +524,45 @@ HTML = """
       document.getElementById('success-msg').classList.add('hidden');
 
       try {
+        if (chunked) {
+          // Send every file in chunks first; the tool then gets their upload ids
+          for (let [i, f] of files.entries()) {
+            const id = await uploadChunked(f, fraction => {
+              const label = files.length > 1 ? 'Uploading ' + (i + 1) + '/' + files.length + ' ' : 'Uploading ';
+              document.getElementById('btn-text').textContent = label + Math.round(fraction * 100) + '%...';
+            });
+            form.append('upload', id);
+          }
+          document.getElementById('btn-text').textContent = 'Processing...';
+        }
+
         const res = await fetch('/' + current_tool.id, { method: 'POST', body: form });
-        const data = await res.json();
-        
+        let data = await res.json();
+
+        // Work runs in the background; poll the job until it finishes
+        while (data.job || data.status === 'queued' || data.status === 'running') {
+          await new Promise(r => setTimeout(r, 1000));
+          data = await (await fetch(data.status_url || '/jobs/' + data.id)).json();
+          if (data.status === 'queued') {
+            document.getElementById('btn-text').textContent = 'Waiting in queue (' + data.position + ')...';
+          } else if (data.progress) {
+            document.getElementById('btn-text').textContent = 'Processing ' + data.progress.done + '/' + data.progress.total + '...';
+          }
+        }
+
         if (data.url) {
           document.getElementById('download-link').href = data.url;
           document.getElementById('download-link').classList.remove('hidden');
           document.getElementById('success-msg').classList.remove('hidden');
           document.getElementById('btn-text').textContent = 'Done!';
+          const result = data.result || {};
+          let note = '';
+          if (result.compressed_size) {
+            note = 'Reduced from ' + (result.original_size/1024/1024).toFixed(2) + ' MB to ' + (result.compressed_size/1024/1024).toFixed(2) + ' MB';
+          } else if (result.incremental) {
+            note = 'Pages updated in place without rewriting the file';
+          }
+          document.getElementById('result-note').textContent = note;
         } else {
           alert(data.error || 'Processing failed. Please try again.');
           document.getElementById('btn-text').textContent = 'Process PDF';
@@ -314,12 +591,61 @@ HTML = """
 """
 
 TOOLS = [
-    {"id": "merge", "name": "Merge PDF", "desc": "Combine multiple PDFs into one", "icon": "ph-files", "color": "text-red-600", "bg": "bg-red-100", "multiple": True},
-    {"id": "split", "name": "Split PDF", "desc": "Extract pages or split into parts", "icon": "ph-scissors", "color": "text-purple-600", "bg": "bg-purple-100"},
-    {"id": "compress", "name": "Compress PDF", "desc": "Reduce file size significantly", "icon": "ph-arrows-in-line-horizontal", "color": "text-green-600", "bg": "bg-green-100"},
-    {"id": "word", "name": "PDF to Word", "desc": "Convert to editable .docx", "icon": "ph-microsoft-word-logo", "color": "text-blue-600", "bg": "bg-blue-100"},
-    {"id": "excel", "name": "PDF to Excel", "desc": "Extract tables to .xlsx", "icon": "ph-microsoft-excel-logo", "color": "text-green-600", "bg": "bg-green-100"},
-    {"id": "ppt", "name": "PDF to PowerPoint", "desc": "Convert to .pptx slides", "icon": "ph-microsoft-powerpoint-logo", "color": "text-orange-600", "bg": "bg-orange-100"},
+    {
+        "id": "merge",
+        "name": "Merge PDF",
+        "desc": "Combine multiple PDFs into one",
+        "icon": "ph-files",
+        "color": "text-red-600",
+        "bg": "bg-red-100",
+        "multiple": True,
+        "options": '<label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">Pages per file, separated by ; (e.g., 1-3;;2,5 or leave empty for all pages):</span><input type="text" name="ranges" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500" placeholder="1-3;;2,5"></label>'
+    },
+    {
+        "id": "split",
+        "name": "Split PDF",
+        "desc": "Extract pages or split into parts",
+        "icon": "ph-scissors",
+        "color": "text-purple-600",
+        "bg": "bg-purple-100",
+        "options": '<div class="grid grid-cols-2 gap-4"><label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">Ranges, one file each (e.g., 1-3,7,9-12):</span><input type="text" name="ranges" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500" placeholder="1-3,7..."></label><label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">Or split every N pages:</span><input type="number" name="every" min="1" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500" placeholder="1"></label></div>'
+    },
+    {
+        "id": "compress",
+        "name": "Compress PDF",
+        "desc": "Reduce file size significantly",
+        "icon": "ph-arrows-in-line-horizontal",
+        "color": "text-green-600",
+        "bg": "bg-green-100",
+        "options": '<label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">Compression level:</span><select name="preset" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500"><option value="screen">Screen - smallest file, 72 DPI images</option><option value="ebook" selected>eBook - balanced, 150 DPI images</option><option value="print">Print - high quality, 300 DPI images</option><option value="lossless">Lossless - no image changes</option></select></label>'
+    },
+    {
+        "id": "word",
+        "name": "PDF to Word",
+        "desc": "Convert to editable .docx",
+        "icon": "ph-microsoft-word-logo",
+        "color": "text-blue-600",
+        "bg": "bg-blue-100",
+        "options": '<div class="grid grid-cols-2 gap-4"><label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">First page:</span><input type="number" name="start" min="1" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500" placeholder="1"></label><label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">Last page:</span><input type="number" name="end" min="1" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500" placeholder="last"></label></div>'
+    },
+    {
+        "id": "excel",
+        "name": "PDF to Excel",
+        "desc": "Extract tables to .xlsx",
+        "icon": "ph-microsoft-excel-logo",
+        "color": "text-green-600",
+        "bg": "bg-green-100",
+        "options": '<label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">Pages (e.g., 1-3,7,9-12 or leave empty for all pages):</span><input type="text" name="pages" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500" placeholder="1-3,7..."></label>'
+    },
+    {
+        "id": "ppt",
+        "name": "PDF to PowerPoint",
+        "desc": "Convert to .pptx slides",
+        "icon": "ph-microsoft-powerpoint-logo",
+        "color": "text-orange-600",
+        "bg": "bg-orange-100",
+        "options": '<div class="grid grid-cols-3 gap-4"><label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">Resolution:</span><select name="dpi" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500"><option value="96">96 DPI</option><option value="144" selected>144 DPI</option><option value="200">200 DPI</option></select></label><label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">Image format:</span><select name="format" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500"><option value="png">PNG (lossless)</option><option value="jpeg">JPEG (faster, smaller)</option></select></label><label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">JPEG quality:</span><input type="number" name="quality" min="1" max="100" value="85" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500"></label></div>'
+    },
     {
         "id": "organize", 
         "name": "Organize Pages", 
@@ -327,156 +653,1904 @@ TOOLS = [
         "icon": "ph-squares-four", 
         "color": "text-indigo-600", 
         "bg": "bg-indigo-100",
-        "options": '<label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">Page order (e.g., 3,1,2,5 or leave empty for all pages):</span><input type="text" name="order" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500" placeholder="1,2,3..."></label>'
+        "preview": True,
+        "options": '<label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">Page order (e.g., 3,1,2,5-7 or 10-1; repeat a page to duplicate it; leave empty for all pages):</span><input type="text" name="order" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500" placeholder="1,2,3..."></label><div class="grid grid-cols-2 gap-4"><label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">Rotate pages (e.g., @90 for all, or 1-3@90,7@180):</span><input type="text" name="rotate" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500" placeholder="2@90"></label><label class="block"><span class="text-sm font-medium text-gray-700 dark:text-gray-300">Delete pages (e.g., 2,4-6):</span><input type="text" name="delete" class="mt-1 block w-full px-4 py-2 border border-gray-300 dark:border-slate-600 rounded-lg bg-white dark:bg-slate-700 text-gray-900 dark:text-gray-100 focus:ring-2 focus:ring-blue-500" placeholder="4-6"></label></div>'
     },
 ]
 
+# --- Tool implementations -------------------------------------------------
+# Each tool takes the saved upload paths plus the submitted form options and
+# returns a result dict whose "file" entry names the output in downloads/.
+# They run inside the job worker processes; the exceptions are the streamed
+# split and page previews, which use MuPDF in request threads.
+
+_progress_queue = None
+# MuPDF is not thread-safe. Request threads that use it (streamed split,
+# previews) hold this lock around every call, and job workers are single
+# threaded so it is never contended there.
+_mupdf_lock = threading.Lock()
+_current_job = None
+_stage_times = {}
+_stage_stack = []
+
+def report_progress(done, total):
+    """Send page-level progress for the running job back to the web process."""
+    if _progress_queue is not None and _current_job is not None:
+        _progress_queue.put((_current_job, done, total))
+
+@contextmanager
+def stage(name):
+    """Add the time spent in the block to the job's timing for a stage.
+
+    Stages are open, process and write. A stage nested in another is
+    subtracted from the outer one, so the timings add up to the job's run.
+    """
+    start = time.perf_counter()
+    _stage_stack.append(0.0)
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = _stage_stack.pop()
+        _stage_times[name] = _stage_times.get(name, 0.0) + elapsed - nested
+        if _stage_stack:
+            _stage_stack[-1] += elapsed
+
+def int_option(options, name, default, low, high):
+    """Read an integer form option, clamped to [low, high]."""
+    try:
+        value = int(options.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(low, min(high, value))
+
+def parse_page_ranges(spec, page_count):
+    """Turn a spec like "1-3,7,9-12" into 0-based page indices.
+
+    Ranges may run backwards ("5-1") or be open-ended ("7-"); an empty spec
+    selects every page. Pages past the end of the document are skipped.
+    """
+    if not spec or not spec.strip():
+        return list(range(page_count))
+    indices = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition('-')
+        try:
+            start = int(first)
+            stop = (int(last) if last.strip() else max(start, page_count)) if sep else start
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part}")
+        if start < 1 or stop < 1:
+            raise ValueError(f"Invalid page range: {part}")
+        step = 1 if stop >= start else -1
+        indices.extend(i - 1 for i in range(start, stop + step, step) if i <= page_count)
+    return indices
+
+def run_ordered(func, tasks, workers):
+    """Yield func(*task) for each task, in task order.
+
+    With more than one worker the tasks run on a process pool, at most two
+    per worker in flight, so finished results never pile up ahead of the
+    consumer. Each task must be cheap to pickle (paths, not documents).
+    """
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        for task in tasks:
+            yield func(*task)
+        return
+    ctx = multiprocessing.get_context(app.config['JOB_START_METHOD'])
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        in_flight = deque()
+        for task in tasks:
+            in_flight.append(pool.submit(func, *task))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+def merge_pdfs(paths, options):
+    """Append the inputs one at a time, flushing to disk every few pages.
+
+    Each source is closed once copied. After MERGE_BATCH_PAGES pages the
+    output is saved and reopened from disk (later batches are appended with
+    incremental saves), so memory stays bounded by one batch plus one input
+    however many files are merged. The ranges option holds one page range
+    per input, separated by ";"; an empty entry takes every page.
+    """
+    ranges = options.get('ranges', '').split(';')
+    output = f"merged_{uuid.uuid4().hex}.pdf"
+    target = f"downloads/{output}"
+    batch = app.config['MERGE_BATCH_PAGES']
+    merger = fitz.open()
+    on_disk = False
+    pending = 0
+    for n, path in enumerate(paths):
+        if os.path.getsize(path):
+            with stage("open"):
+                src = fitz.open(path)
+            try:
+                pages = parse_page_ranges(ranges[n] if n < len(ranges) else '', len(src))
+            except ValueError as e:
+                src.close()
+                merger.close()
+                raise ValueError(f"File {n + 1}: {e}")
+            with stage("process"):
+                for first, last in _page_runs(pages):
+                    merger.insert_pdf(src, from_page=first, to_page=last)
+            src.close()
+            pending += len(pages)
+        if pending >= batch:
+            with stage("write"):
+                if on_disk:
+                    merger.saveIncr()
+                    merger.close()
+                else:
+                    merger.save(target, garbage=1)
+                    merger.close()
+                    on_disk = True
+                merger = fitz.open(target)
+            pending = 0
+        report_progress(n + 1, len(paths))
+    with stage("write"):
+        if not len(merger):
+            merger.close()
+            raise ValueError("No pages selected to merge")
+        if on_disk:
+            if pending:
+                merger.saveIncr()
+        else:
+            merger.save(target, garbage=1)
+        merger.close()
+    return {"file": output}
+
+def _recompress_images(path, images, quality):
+    """Downsample and JPEG-encode images; runs in a page worker.
+
+    images holds (xref, width, height) with the target pixel size. Returns
+    (xref, jpeg bytes) for every image that came out smaller than before.
+    """
+    doc = fitz.open(path)
+    results = []
+    for xref, width, height in images:
+        pix = fitz.Pixmap(doc, xref)
+        if pix.alpha:
+            pix = fitz.Pixmap(pix, 0)
+        if pix.colorspace is None:
+            continue
+        if pix.colorspace.n not in (1, 3):
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        if (width, height) != (pix.width, pix.height):
+            pix = fitz.Pixmap(pix, width, height, None)
+        data = pix.tobytes("jpeg", jpg_quality=quality)
+        if len(data) < len(doc.xref_stream_raw(xref)):
+            results.append((xref, data))
+    doc.close()
+    return results
+
+def _image_plan(doc, dpi):
+    """Pick the images worth re-encoding and their target pixel sizes.
+
+    Returns {stream digest: [(xref, width, height), [(page number, xref)]]}
+    so identical images are encoded once. An image is scaled down to dpi at
+    its largest placement on any page, over every copy of its stream; JPEGs
+    already at or below that are left alone, as are masks, images with soft
+    masks and bilevel scans.
+    """
+    images = {}
+    for page in doc:
+        for xref, smask, width, height, bpc, colorspace, _, _, filter_, _ in page.get_images(full=True):
+            if smask or bpc < 8 or not colorspace or width * height < 64 * 64:
+                continue
+            if xref not in images:
+                images[xref] = {"page": page.number, "width": width, "height": height,
+                                "filter": filter_, "inches_w": 0, "inches_h": 0}
+            image = images[xref]
+            for placement in page.get_image_rects(xref):
+                image['inches_w'] = max(image['inches_w'], placement.width / 72)
+                image['inches_h'] = max(image['inches_h'], placement.height / 72)
+
+    groups = {}
+    for xref, image in images.items():
+        digest = hashlib.sha256(doc.xref_stream_raw(xref)).hexdigest()
+        groups.setdefault(digest, []).append((xref, image))
+    plan = {}
+    for digest, members in groups.items():
+        xref, first = members[0]
+        width, height = first['width'], first['height']
+        inches_w = max(image['inches_w'] for _, image in members)
+        inches_h = max(image['inches_h'] for _, image in members)
+        scale = 1.0
+        if inches_w and inches_h:
+            scale = min(1.0, max(inches_w * dpi / width, inches_h * dpi / height))
+        if scale == 1.0 and first['filter'] == "DCTDecode":
+            continue
+        target = (xref, max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale)))
+        plan[digest] = [target, [(image['page'], member) for member, image in members]]
+    return plan
+
+def compress_pdf(paths, options):
+    """Rewrite a PDF smaller.
+
+    Every preset deduplicates identical objects (images and fonts included),
+    subsets embedded fonts and compresses all streams; screen, ebook and
+    print also downsample and JPEG-encode images, spread over page workers.
+    """
+    preset = COMPRESSION_PRESETS.get(options.get('preset'))
+    with stage("open"):
+        doc = fitz.open(paths[0])
+    recompressed = 0
+    if preset is not None:
+        with stage("process"):
+            plan = _image_plan(doc, preset['dpi'])
+            groups = list(plan.values())
+            step = app.config['IMAGES_PER_TASK']
+            tasks = [(paths[0], [target for target, _ in groups[n:n + step]], preset['quality'])
+                     for n in range(0, len(groups), step)]
+            users = {target[0]: placements for target, placements in groups}
+            done = 0
+            for task, results in zip(tasks, run_ordered(_recompress_images, tasks, app.config['PAGE_WORKERS'])):
+                for xref, data in results:
+                    for page_number, user in users[xref]:
+                        doc[page_number].replace_image(user, stream=data)
+                    recompressed += 1
+                done += len(task[1])
+                report_progress(done, len(groups))
+    with stage("process"):
+        try:
+            doc.subset_fonts()
+        except Exception as e:
+            # Needs fontTools, and some embedded fonts cannot be subset
+            app.logger.info("Font subsetting skipped: %s", e)
+    output = f"compressed_{uuid.uuid4().hex}.pdf"
+    with stage("write"):
+        doc.save(f"downloads/{output}", garbage=4, deflate=True, clean=True, use_objstms=1)
+    doc.close()
+    return {
+        "file": output,
+        "original_size": os.path.getsize(paths[0]),
+        "compressed_size": os.path.getsize(f"downloads/{output}"),
+        "images_recompressed": recompressed,
+    }
+
+def pdf_to_word(paths, options):
+    """Convert pages start..end (1-based, inclusive) to .docx.
+
+    Documents of WORD_PARALLEL_PAGES pages or more use pdf2docx's own
+    multi-process mode over WORD_WORKERS processes. It writes its per-process
+    results to the working directory under fixed names, so the conversion
+    runs inside a private scratch directory.
+    """
+    out = f"word_{uuid.uuid4().hex}.docx"
+    target = os.path.abspath(f"downloads/{out}")
+    source = os.path.abspath(paths[0])
+    began = time.perf_counter()
+    from pdf2docx import Converter
+    with stage("open"):
+        cv = Converter(source)
+    try:
+        page_count = len(cv.fitz_doc)
+        start = int_option(options, 'start', 1, 1, page_count)
+        end = int_option(options, 'end', page_count, start, page_count)
+        # pdf2docx never starts more processes than there are CPUs
+        workers = min(app.config['WORD_WORKERS'], os.cpu_count() or 1, end - start + 1)
+        parallel = workers > 1 and end - start + 1 >= app.config['WORD_PARALLEL_PAGES']
+        cwd = os.getcwd()
+        with stage("process"), tempfile.TemporaryDirectory(dir=app.config['UPLOAD_FOLDER']) as scratch:
+            os.chdir(scratch)
+            try:
+                cv.convert(target, start=start - 1, end=end, multi_processing=parallel, cpu_count=workers)
+            finally:
+                os.chdir(cwd)
+    finally:
+        cv.close()
+    return {
+        "file": out,
+        "pages": end - start + 1,
+        "mode": "parallel" if parallel else "single",
+        "workers": workers if parallel else 1,
+        "seconds": round(time.perf_counter() - began, 3),
+    }
+
+def may_have_table(page):
+    """Cheap check whether pdfplumber could find a table on a fitz page.
+
+    pdfplumber's default table settings build cells from ruling lines only,
+    so a table needs at least two horizontal and two vertical edges among
+    the page's lines, rectangles and curves. Text layout cannot create a
+    cell under that strategy and is not looked at. The count skips
+    pdfplumber's snapping and joining, so it only ever over-estimates and
+    no table is missed.
+    """
+    horizontal = vertical = 0
+    for path in getattr(page, 'get_cdrawings', page.get_drawings)():
+        for item in path['items']:
+            if item[0] in ("re", "qu"):
+                horizontal += 2
+                vertical += 2
+            else:
+                for p0, p1 in zip(item[1:], item[2:]):
+                    if abs(p0[1] - p1[1]) < 0.5:
+                        horizontal += 1
+                    elif item[0] == "l" or abs(p0[0] - p1[0]) < 0.5:
+                        # pdfplumber files every non-horizontal line as vertical
+                        vertical += 1
+            if horizontal >= 2 and vertical >= 2:
+                return True
+    return False
+
+def _extract_tables(path, pages, prefilter=True):
+    """Extract the tables of the given pages; runs in a page worker."""
+    import pdfplumber
+    results = []
+    doc = fitz.open(path)
+    with pdfplumber.open(path) as pdf:
+        for i in pages:
+            if prefilter and not may_have_table(doc[i]):
+                results.append((i, []))
+                continue
+            page = pdf.pages[i]
+            results.append((i, page.extract_tables()))
+            # Drop pdfplumber's cached layout objects before the next page
+            page.close()
+    doc.close()
+    return results
+
+def pdf_to_excel(paths, options):
+    import pandas as pd
+    with stage("open"):
+        doc = fitz.open(paths[0])
+    # Each page once, in the order asked for; sheet names must be unique
+    pages = list(dict.fromkeys(parse_page_ranges(options.get('pages', ''), len(doc))))
+    doc.close()
+    step = app.config['TABLE_PAGES_PER_TASK']
+    prefilter = app.config['TABLE_PREFILTER']
+    tasks = [(paths[0], pages[n:n + step], prefilter) for n in range(0, len(pages), step)]
+
+    out = f"excel_{uuid.uuid4().hex}.xlsx"
+    tables_found = False
+    done = 0
+    with stage("write"), pd.ExcelWriter(f"downloads/{out}") as writer:
+        with stage("process"):
+            for results in run_ordered(_extract_tables, tasks, app.config['PAGE_WORKERS']):
+                for i, tables in results:
+                    if tables:
+                        tables_found = True
+                        for j, table in enumerate(tables):
+                            df = pd.DataFrame(table)
+                            df.to_excel(writer, sheet_name=f"P{i+1}_T{j+1}", index=False)
+                    done += 1
+                    report_progress(done, len(pages))
+        if not tables_found:
+            # Create empty sheet if no tables found
+            pd.DataFrame({"Note": ["No tables found in this PDF"]}).to_excel(writer, sheet_name="Info", index=False)
+    return {"file": out}
+
+def _render_pages(path, start, stop, dpi, fmt, quality):
+    """Rasterize pages [start, stop) to encoded images; runs in a render worker."""
+    doc = fitz.open(path)
+    images = []
+    for page_num in range(start, stop):
+        pix = doc.load_page(page_num).get_pixmap(dpi=dpi)
+        if fmt == "jpeg":
+            images.append(pix.tobytes("jpeg", jpg_quality=quality))
+        else:
+            images.append(pix.tobytes("png"))
+    doc.close()
+    return images
+
+def pdf_to_ppt(paths, options):
+    from pptx import Presentation
+    from pptx.util import Inches
+    dpi = int_option(options, 'dpi', 144, 36, 300)
+    fmt = "jpeg" if options.get('format') == "jpeg" else "png"
+    quality = int_option(options, 'quality', 85, 1, 100)
+    with stage("open"):
+        doc = fitz.open(paths[0])
+    page_count = len(doc)
+    doc.close()
+
+    # Each worker opens the document itself and renders a small range of
+    # pages; slides are added in page order as the ranges come back.
+    step = app.config['RENDER_PAGES_PER_TASK']
+    tasks = [(paths[0], start, min(start + step, page_count), dpi, fmt, quality)
+             for start in range(0, page_count, step)]
+    prs = Presentation()
+    done = 0
+    with stage("process"):
+        for images in run_ordered(_render_pages, tasks, app.config['PAGE_WORKERS']):
+            for image in images:
+                slide = prs.slides.add_slide(prs.slide_layouts[6])
+                slide.shapes.add_picture(io.BytesIO(image), Inches(0), Inches(0), width=Inches(10))
+                done += 1
+                report_progress(done, page_count)
+    out = f"ppt_{uuid.uuid4().hex}.pptx"
+    with stage("write"):
+        prs.save(f"downloads/{out}")
+    return {"file": out}
+
+class ForwardWriter:
+    """Forward-only file object for saving a fitz document into a stream.
+
+    MuPDF only calls tell() while writing a PDF, but PyMuPDF refuses file
+    objects without seek(), and ZIP entry streams have neither.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.position = 0
+
+    def write(self, data):
+        self.raw.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        if (offset if whence == 0 else self.position + offset if whence == 1 else None) != self.position:
+            raise io.UnsupportedOperation("seek")
+        return self.position
+
+class ZipStream(io.RawIOBase):
+    """Write-only sink that collects ZIP bytes until they are drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _page_runs(pages):
+    """Group page indices into (first, last) runs of consecutive pages.
+
+    Runs may descend, which insert_pdf copies in reverse order. One
+    insert_pdf call per run lets the pages of a part share fonts and images.
+    """
+    runs = []
+    for i in pages:
+        if runs:
+            first, last = runs[-1]
+            step = 1 if last >= first else -1
+            if (first == last and abs(i - last) == 1) or (first != last and i == last + step):
+                runs[-1] = (first, i)
+                continue
+        runs.append((i, i))
+    return runs
+
+def split_parts(options, page_count):
+    """Plan a split as (file name, page indices) pairs.
+
+    'ranges' makes one part per comma-separated group ("1-3,7,9-12"),
+    'every' cuts the document into parts of that many pages, and without
+    either every page becomes its own part.
+    """
+    if options.get('ranges', '').strip():
+        groups = [parse_page_ranges(group, page_count) for group in options['ranges'].split(',') if group.strip()]
+    else:
+        every = int_option(options, 'every', 1, 1, max(1, page_count))
+        groups = [list(range(start, min(start + every, page_count))) for start in range(0, page_count, every)]
+    parts = []
+    names = set()
+    for pages in groups:
+        if not pages:
+            continue
+        if len(pages) == 1:
+            name = f"page_{pages[0]+1}"
+        else:
+            name = f"pages_{pages[0]+1}-{pages[-1]+1}"
+        while f"{name}.pdf" in names:
+            name += "_"
+        names.add(f"{name}.pdf")
+        parts.append((f"{name}.pdf", pages))
+    if not parts:
+        raise ValueError("No pages selected")
+    return parts
+
+def write_split(doc, parts, zf):
+    """Write each part straight into a ZIP entry, yielding after each one.
+
+    The MuPDF lock is held per part, not across yields, so a slow client
+    reading a streamed split does not hold up other request threads.
+    """
+    for name, pages in parts:
+        with _mupdf_lock:
+            part = fitz.open()
+            for first, last in _page_runs(pages):
+                part.insert_pdf(doc, from_page=first, to_page=last)
+            with zf.open(name, 'w') as dest:
+                part.save(ForwardWriter(dest))
+            part.close()
+        yield name
+
+def split_pdf(paths, options):
+    with stage("open"):
+        doc = fitz.open(paths[0])
+    parts = split_parts(options, len(doc))
+    out = f"split_{uuid.uuid4().hex}.zip"
+    # Parts are built and written to the ZIP in one pass
+    with stage("write"), zipfile.ZipFile(f"downloads/{out}", 'w') as zf:
+        for n, _ in enumerate(write_split(doc, parts, zf)):
+            report_progress(n + 1, len(parts))
+    doc.close()
+    return {"file": out}
+
+def stream_split(path, options):
+    """Split in the request thread, sending the ZIP while it is written."""
+    doc = None
+    try:
+        with _mupdf_lock:
+            doc = fitz.open(path)
+            page_count = len(doc)
+        parts = split_parts(options, page_count)
+    except Exception:
+        if doc is not None:
+            with _mupdf_lock:
+                doc.close()
+        os.remove(path)
+        raise
+
+    def generate():
+        sink = ZipStream()
+        try:
+            with zipfile.ZipFile(sink, 'w') as zf:
+                for _ in write_split(doc, parts, zf):
+                    yield sink.drain()
+            yield sink.drain()
+        finally:
+            with _mupdf_lock:
+                doc.close()
+            os.remove(path)
+
+    return Response(generate(), mimetype='application/zip',
+                    headers={'Content-Disposition': 'attachment; filename=split.zip'})
+
+def parse_page_ops(spec, page_count):
+    """Turn a spec like "3,1-2@90,5-4" into (0-based page, degrees) pairs.
+
+    Items are page ranges as in parse_page_ranges, each optionally followed
+    by @ and a clockwise rotation in multiples of 90. An item of just "@90"
+    stands for every page.
+    """
+    ops = []
+    for part in spec.split(','):
+        pages, sep, angle = part.strip().partition('@')
+        if not pages and not sep:
+            continue
+        degrees = 0
+        if sep:
+            try:
+                degrees = int(angle)
+            except ValueError:
+                raise ValueError(f"Invalid rotation: {part.strip()}")
+            if degrees % 90:
+                raise ValueError(f"Rotation must be a multiple of 90: {part.strip()}")
+        ops.extend((i, degrees) for i in parse_page_ranges(pages, page_count))
+    return ops
+
+def organize_plan(options, page_count):
+    """Compile the organize options into a list of (source page, rotation).
+
+    order lists the output pages (repeats duplicate a page, items may carry
+    @degrees), rotate adds rotations by source page and delete drops source
+    pages wherever they appear. Rotations are normalised to 0-270.
+    """
+    if options.get('order', '').strip():
+        plan = parse_page_ops(options['order'], page_count)
+    else:
+        plan = [(i, 0) for i in range(page_count)]
+    turns = defaultdict(int)
+    for i, degrees in parse_page_ops(options.get('rotate', ''), page_count):
+        turns[i] += degrees
+    deleted = set(parse_page_ranges(options['delete'], page_count)) if options.get('delete', '').strip() else set()
+    plan = [(i, (degrees + turns[i]) % 360) for i, degrees in plan if i not in deleted]
+    if not plan:
+        raise ValueError("No pages left after applying the page operations")
+    return plan
+
+def organize_pages(paths, options):
+    """Reorder, rotate, delete and duplicate pages in one pass.
+
+    When the plan uses every source page exactly once (a reorder and/or
+    rotation), the upload itself is updated with an incremental save, which
+    appends a new page tree and changed pages instead of rewriting every
+    object, and becomes the output. Deleting pages always takes the full
+    rewrite: an incremental save would leave the deleted pages' content
+    recoverable from the file. So do duplicates, which need page objects of
+    their own; select() would put one object in the page tree twice.
+    """
+    with stage("open"):
+        doc = fitz.open(paths[0])
+    try:
+        with stage("process"):
+            plan = organize_plan(options, len(doc))
+            incremental = (sorted(i for i, _ in plan) == list(range(len(doc)))
+                           and bool(doc.can_save_incrementally()))
+            out = f"organized_{uuid.uuid4().hex}.pdf"
+            if incremental:
+                for i, degrees in plan:
+                    if degrees:
+                        doc[i].set_rotation((doc[i].rotation + degrees) % 360)
+                if [i for i, _ in plan] != list(range(len(doc))):
+                    doc.select([i for i, _ in plan])
+            else:
+                output = fitz.open()
+                for degrees, ops in groupby(plan, key=lambda op: op[1]):
+                    for first, last in _page_runs([i for i, _ in ops]):
+                        start = len(output)
+                        output.insert_pdf(doc, from_page=first, to_page=last)
+                        if degrees:
+                            for page in output.pages(start):
+                                page.set_rotation((page.rotation + degrees) % 360)
+        with stage("write"):
+            if incremental:
+                if doc.is_dirty:
+                    doc.saveIncr()
+                doc.close()
+                os.replace(paths[0], f"downloads/{out}")
+            else:
+                output.save(f"downloads/{out}", garbage=1)
+                output.close()
+    finally:
+        if not doc.is_closed:
+            doc.close()
+    return {"file": out, "pages": len(plan), "incremental": incremental}
+
+TOOL_RUNNERS = {
+    "merge": merge_pdfs,
+    "split": split_pdf,
+    "compress": compress_pdf,
+    "word": pdf_to_word,
+    "excel": pdf_to_excel,
+    "ppt": pdf_to_ppt,
+    "organize": organize_pages,
+}
+
+def _batch_item(tool_id, path, options):
+    """Run a single-file tool for a batch; runs in a batch worker.
+
+    The batch already spreads files over BATCH_WORKERS processes, so the
+    tool itself runs single-process: no page pool, no pdf2docx pool.
+    """
+    saved = {name: app.config[name] for name in ('PAGE_WORKERS', 'WORD_WORKERS')}
+    app.config.update(dict.fromkeys(saved, 1))
+    try:
+        return TOOL_RUNNERS[tool_id]([path], options), None
+    except Exception as e:
+        return None, str(e)
+    finally:
+        # With one batch worker this runs inside the job worker itself
+        app.config.update(saved)
+
+def run_batch(paths, options):
+    """Apply one tool to every input and pack the outputs into a ZIP.
+
+    options holds the tool id, the original file names, inputs rejected at
+    upload as (name, error) pairs and the tool's own options. Files run on
+    up to BATCH_WORKERS processes; one failing file does not stop the rest.
+    manifest.json in the ZIP records the status of every file.
+    """
+    tool_id = options['tool']
+    tasks = [(tool_id, path, options['options']) for path in paths]
+    manifest = [{"name": name, "status": "failed", "error": error} for name, error in options['rejected']]
+    taken = Counter()
+    out = f"batch_{uuid.uuid4().hex}.zip"
+    with zipfile.ZipFile(f"downloads/{out}", 'w') as zf:
+        results = run_ordered(_batch_item, tasks, app.config['BATCH_WORKERS'])
+        for n, (name, (result, error)) in enumerate(zip(options['names'], results)):
+            if result is None:
+                manifest.append({"name": name, "status": "failed", "error": error})
+            else:
+                output = f"downloads/{result.pop('file')}"
+                stem = os.path.splitext(os.path.basename(name))[0] or "file"
+                arcname = f"{stem}{os.path.splitext(output)[1]}"
+                taken[arcname] += 1
+                if taken[arcname] > 1:
+                    arcname = f"{stem}_{taken[arcname]}{os.path.splitext(output)[1]}"
+                with stage("write"):
+                    zf.write(output, arcname)
+                os.remove(output)
+                manifest.append({"name": name, "status": "done", "output": arcname, **result})
+            report_progress(n + 1, len(paths))
+        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+    failed = sum(1 for entry in manifest if entry['status'] == "failed")
+    return {"file": out, "files": len(manifest), "succeeded": len(manifest) - failed, "failed": failed}
+
+# Converter packages are slow to import and large, so each tool imports its
+# own on first use and workers that only merge or compress never load them.
+TOOL_IMPORTS = {
+    "word": ["pdf2docx"],
+    "excel": ["pandas", "openpyxl", "pdfplumber"],
+    "ppt": ["pptx"],
+}
+
+def warm_up(tool_ids):
+    """Import the converters of the given tools now instead of on first use."""
+    for tool_id in tool_ids:
+        for module in TOOL_IMPORTS.get(tool_id, ()):
+            importlib.import_module(module)
+
+# Everything a job worker can run: the tools plus batches of them
+JOB_RUNNERS = dict(TOOL_RUNNERS, batch=run_batch)
+
+# --- Job queue ---------------------------------------------------------------
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+    warm_up(app.config['WARM_UP_TOOLS'])
+
+def _run_job(job_id, tool_id, paths, options, profile=False):
+    """Run a tool in a job worker.
+
+    Returns the tool's result, the per-stage timings and, when asked for,
+    the folded stack samples of the run.
+    """
+    global _current_job
+    _current_job = job_id
+    _stage_times.clear()
+    profiler = SamplingProfiler(app.config['PROFILE_INTERVAL']) if profile else None
+    try:
+        if profiler is None:
+            result = JOB_RUNNERS[tool_id](paths, options)
+        else:
+            with profiler:
+                result = JOB_RUNNERS[tool_id](paths, options)
+        return result, dict(_stage_times), profiler and profiler.folded()
+    finally:
+        _current_job = None
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+class SamplingProfiler:
+    """Samples the calling thread's Python stack at a fixed interval.
+
+    Output is in folded-stack format, one "outer;inner count" line per
+    distinct stack, which flamegraph.pl and speedscope read directly. Long
+    calls into MuPDF hold the GIL, so their time shows up on the Python
+    frame that made the call.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.counts = Counter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def __enter__(self):
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._sampler.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)})")
+                frame = frame.f_back
+            self.counts[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common())
+
+
+class JobManager:
+    """Runs tool jobs on a process pool behind a bounded FIFO queue.
+
+    Jobs wait in the queue until a worker is free and their tool is below its
+    concurrency limit; jobs for other tools may overtake a blocked one.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.RLock()
+        self._jobs = {}
+        self._pending = deque()
+        self._running = {}
+        self._pool = None
+        self._progress = None
+
+    def _ensure_pool(self):
+        # Created on first use so importing the app never forks or spawns.
+        if self._pool is None:
+            ctx = multiprocessing.get_context(self.config['JOB_START_METHOD'])
+            if self._progress is None:
+                self._progress = ctx.Queue()
+                threading.Thread(target=self._watch_progress, args=(self._progress,), daemon=True).start()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.config['JOB_WORKERS'],
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(self._progress,),
+            )
+        return self._pool
+
+    def _watch_progress(self, progress):
+        while True:
+            job_id, done, total = progress.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None and job['status'] == 'running':
+                    job['progress'] = {"done": done, "total": total}
+
+    def submit(self, tool_id, paths, options, cache_key=None, trace=None, profile=False):
+        """Queue a job; returns None when the queue, or its share for heavy
+        tools, is full.
+
+        trace, if given, is a dict of stage timings measured in the web
+        process; the worker's stage timings are added to it. profile runs the
+        tool under the sampling profiler.
+        """
+        with self._lock:
+            self._prune()
+            job = {
+                "id": uuid.uuid4().hex,
+                "tool": tool_id,
+                "status": "queued",
+                "created": time.time(),
+                "progress": None,
+                "paths": paths,
+                "options": options,
+                "cache_key": cache_key,
+                "trace": trace,
+                "profile": profile,
+            }
+            if len(self._pending) >= self.config['JOB_QUEUE_SIZE']:
+                return None
+            if self._is_heavy(job):
+                heavy = sum(1 for other in self._pending if self._is_heavy(other))
+                if heavy >= self.config['HEAVY_QUEUE_SIZE']:
+                    return None
+            self._jobs[job['id']] = job
+            self._pending.append(job)
+            self._dispatch()
+            return job
+
+    def shutdown(self):
+        """Stop the worker pool after the running jobs finish."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            view = {k: v for k, v in job.items()
+                    if k not in ("paths", "options", "cache_key", "profile") and v is not None}
+            view['progress'] = job['progress']
+            if job['status'] == 'queued':
+                view['position'] = self._pending.index(job) + 1
+            if isinstance(job['profile'], str):
+                view['profile_url'] = f"/jobs/{job_id}/profile"
+            return view
+
+    def counts(self):
+        with self._lock:
+            return {"queued": len(self._pending), "running": len(self._running)}
+
+    def profile(self, job_id):
+        """Folded stack samples of a profiled job, once it has finished."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and isinstance(job['profile'], str):
+                return job['profile']
+            return None
+
+    @staticmethod
+    def _is_heavy(job):
+        # A batch is as heavy as the tool it runs
+        tool_id = job['options']['tool'] if job['tool'] == "batch" else job['tool']
+        return tool_id in HEAVY_TOOLS
+
+    def _can_start(self, job):
+        running = list(self._running.values())
+        limit = self.config['TOOL_CONCURRENCY'].get(job['tool'])
+        if limit is not None and sum(1 for other in running if other['tool'] == job['tool']) >= limit:
+            return False
+        if self._is_heavy(job):
+            heavy = sum(1 for other in running if self._is_heavy(other))
+            if heavy >= self.config['HEAVY_JOB_LIMIT']:
+                return False
+        return True
+
+    def _dispatch(self):
+        for job in list(self._pending):
+            if len(self._running) >= self.config['JOB_WORKERS']:
+                break
+            if not self._can_start(job):
+                continue
+            self._pending.remove(job)
+            job['status'] = 'running'
+            job['started'] = time.time()
+            self._running[job['id']] = job
+            future = self._ensure_pool().submit(_run_job, job['id'], job['tool'], job['paths'], job['options'],
+                                                job['profile'])
+            future.add_done_callback(lambda f, job=job: self._finish(job, f))
+
+    def _finish(self, job, future):
+        with self._lock:
+            self._running.pop(job['id'], None)
+            job['finished'] = time.time()
+            tool = job['tool']
+            try:
+                job['result'], stages, folded = future.result()
+                job['status'] = 'done'
+                job['url'] = f"/download/{job['result']['file']}"
+                metrics.observe("pdftoolz_job_seconds", job['finished'] - job['created'], tool=tool)
+                for name, seconds in stages.items():
+                    metrics.observe("pdftoolz_stage_seconds", seconds, tool=tool, stage=name)
+                output = f"downloads/{job['result']['file']}"
+                if os.path.exists(output):
+                    metrics.inc("pdftoolz_bytes_out_total", os.path.getsize(output), tool=tool)
+                if job['trace'] is not None:
+                    job['trace'].update(stages)
+                if folded is not None:
+                    job['profile'] = folded
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); start a fresh pool for later jobs.
+                self._pool = None
+                job['status'] = 'failed'
+                job['error'] = "Processing was interrupted, please try again"
+                metrics.inc("pdftoolz_errors_total", tool=tool, reason="worker_died")
+                app.logger.error("Job %s (%s): worker process died", job['id'], tool)
+            except Exception as e:
+                job['status'] = 'failed'
+                job['error'] = str(e)
+                metrics.inc("pdftoolz_errors_total", tool=tool, reason="job")
+                app.logger.error("Job %s (%s) failed", job['id'], tool, exc_info=e)
+            # The worker removes its inputs, unless it died before it could
+            for path in job['paths']:
+                if os.path.exists(path):
+                    os.remove(path)
+            self._dispatch()
+        # Outside the jobs lock: writing the entry may evict and delete outputs
+        if job['status'] == 'done' and job['cache_key']:
+            result_cache.put(job['cache_key'], job['result'])
+
+    def active_paths(self):
+        """Upload paths still needed by queued or running jobs."""
+        with self._lock:
+            return {
+                os.path.normpath(path)
+                for job in self._jobs.values() if job['status'] in ("queued", "running")
+                for path in job['paths']
+            }
+
+    def _prune(self):
+        cutoff = time.time() - self.config['JOB_RETENTION']
+        for job_id, job in list(self._jobs.items()):
+            if job.get('finished', cutoff) < cutoff:
+                del self._jobs[job_id]
+
+jobs = JobManager(app.config)
+
+# --- Metrics -------------------------------------------------------------------
+
+METRIC_HELP = {
+    "pdftoolz_requests_total": ("counter", "Tool requests received"),
+    "pdftoolz_errors_total": ("counter", "Failed tool requests by reason"),
+    "pdftoolz_bytes_in_total": ("counter", "Bytes uploaded to tools"),
+    "pdftoolz_bytes_out_total": ("counter", "Bytes of tool output produced"),
+    "pdftoolz_download_bytes_total": ("counter", "Bytes served from /download"),
+    "pdftoolz_job_seconds": ("histogram", "Time from upload to finished job"),
+    "pdftoolz_stage_seconds": ("histogram", "Time per processing stage (ingest, open, process, write)"),
+    "pdftoolz_jobs": ("gauge", "Jobs by state"),
+    "pdftoolz_cache_lookups_total": ("counter", "Result cache lookups by outcome"),
+    "pdftoolz_previews_total": ("counter", "Page thumbnails served by source (memory, disk, render)"),
+}
+
+class Metrics:
+    """Counters and histograms rendered in the Prometheus text format.
+
+    Values are per process: under a multi-process server each worker
+    reports its own and the scraper sums them.
+    """
+
+    BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._values[name, tuple(sorted(labels.items()))] += value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[name, tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            key = (name, tuple(sorted(labels.items())))
+            buckets, total, count = self._histograms.get(key, ([0] * len(self.BUCKETS), 0.0, 0))
+            for i, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    buckets[i] += 1
+            self._histograms[key] = (buckets, total + value, count + 1)
+
+    @staticmethod
+    def _labels(labels, **extra):
+        pairs = list(labels) + list(extra.items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    @staticmethod
+    def _number(value):
+        # Full precision: %g would turn byte counts into 1.29732e+07
+        value = float(value)
+        return str(int(value)) if value.is_integer() else repr(value)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, text) in METRIC_HELP.items():
+                lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+                for (metric, labels), value in sorted(self._values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{self._labels(labels)} {self._number(value)}")
+                for (metric, labels), (buckets, total, count) in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, n in zip(self.BUCKETS, buckets):
+                        lines.append(f"{name}_bucket{self._labels(labels, le=f'{bound:g}')} {n}")
+                    lines.append(f"{name}_bucket{self._labels(labels, le='+Inf')} {count}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {self._number(total)}")
+                    lines.append(f"{name}_count{self._labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+# --- Result cache --------------------------------------------------------------
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def normalize_options(options):
+    """Canonical form of tool options so equivalent requests share a key."""
+    normalized = {}
+    for name, value in options.items():
+        value = ''.join(str(value).split())
+        if value:
+            normalized[name] = value
+    return normalized
+
+class ResultCache:
+    """Maps a cache key to the result of an earlier job.
+
+    Each entry is a small JSON file in the cache folder pointing at an output
+    in downloads/; its mtime is the last time it was used. Entries unused for
+    RESULT_CACHE_MAX_AGE are dropped, then least recently used ones until the
+    outputs fit in RESULT_CACHE_MAX_BYTES. Evicted outputs are deleted.
+
+    The folder is read once into an in-memory index (key -> last use, output
+    size, result), so lookups and evictions never rescan it.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._index = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(tool_id, digests, options):
+        material = json.dumps([tool_id, normalize_options(options), digests], sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.config['RESULT_CACHE_FOLDER'], f"{key}.json")
+
+    def _load(self):
+        if self._index is not None:
+            return self._index
+        self._index = {}
+        folder = self.config['RESULT_CACHE_FOLDER']
+        for name in os.listdir(folder):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(folder, name)
+            try:
+                with open(path) as f:
+                    result = json.load(f)
+                output = f"downloads/{result['file']}"
+                size = os.path.getsize(output) if os.path.exists(output) else 0
+                self._index[name[:-len('.json')]] = [os.path.getmtime(path), size, result]
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+        return self._index
+
+    def get(self, key):
+        with self._lock:
+            entry = self._load().get(key)
+            try:
+                # Touching the output also keeps it from the file reaper
+                os.utime(f"downloads/{entry[2]['file']}")
+                os.utime(self._entry_path(key))
+            except (OSError, TypeError):
+                # The output was reaped or deleted under us
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            entry[0] = time.time()
+            self.hits += 1
+            return dict(entry[2])
+
+    def put(self, key, result):
+        path = self._entry_path(key)
+        output = f"downloads/{result['file']}"
+        size = os.path.getsize(output) if os.path.exists(output) else 0
+        with self._lock:
+            with open(f"{path}.tmp", 'w') as f:
+                json.dump(result, f)
+            os.replace(f"{path}.tmp", path)
+            self._load()[key] = [time.time(), size, dict(result)]
+            self._evict(keep=key)
+
+    def _drop(self, key):
+        entry = self._index.pop(key)
+        for name in (self._entry_path(key), f"downloads/{entry[2]['file']}"):
+            if os.path.exists(name):
+                os.remove(name)
+
+    def _evict(self, keep):
+        total = sum(size for _, size, _ in self._index.values())
+        cutoff = time.time() - self.config['RESULT_CACHE_MAX_AGE']
+        for key, (used, size, _) in sorted(self._index.items(), key=lambda item: item[1][0]):
+            if used >= cutoff and total <= self.config['RESULT_CACHE_MAX_BYTES']:
+                break
+            if key == keep:
+                continue
+            self._drop(key)
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            index = self._load()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(index),
+                "bytes": sum(size for _, size, _ in index.values()),
+            }
+
+result_cache = ResultCache(app.config)
+
+# --- File lifecycle --------------------------------------------------------------
+
+class FileReaper:
+    """Background sweeper for uploads/ and downloads/.
+
+    Every REAPER_INTERVAL seconds it deletes files not modified for FILE_TTL,
+    then the oldest remaining ones until both folders fit DISK_QUOTA_BYTES.
+    Inputs of queued and running jobs are never touched.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.config['REAPER_INTERVAL'])
+            try:
+                self.sweep()
+            except Exception:
+                app.logger.exception("File reaper sweep failed")
+
+    def sweep(self):
+        active = jobs.active_paths()
+        files = []
+        for folder in (self.config['UPLOAD_FOLDER'], self.config['DOWNLOAD_FOLDER']):
+            for entry in os.scandir(folder):
+                if entry.is_file() and os.path.normpath(entry.path) not in active:
+                    stat = entry.stat()
+                    # Chunked uploads are sparse until their chunks arrive
+                    size = stat.st_blocks * 512 if entry.name.startswith('chunked_') else stat.st_size
+                    files.append((stat.st_mtime, size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        cutoff = time.time() - self.config['FILE_TTL']
+        removed = 0
+        for mtime, size, path in files:
+            if mtime >= cutoff and total <= self.config['DISK_QUOTA_BYTES']:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
+
+reaper = FileReaper(app.config)
+
+@app.before_request
+def start_reaper():
+    # Started lazily so a pre-forking server doesn't start it in the parent
+    reaper.start()
+
+# --- Page previews ---------------------------------------------------------------
+
+class PreviewCache:
+    """Renders page thumbnails on demand and keeps them in a two-level LRU.
+
+    Documents live in uploads/ as preview_<sha256>.pdf, so the reaper drops
+    ones nobody has looked at for FILE_TTL. Thumbnails are keyed on document
+    hash, page and width; recent ones are held in memory up to
+    PREVIEW_MEMORY_BYTES, all of them on disk up to PREVIEW_DISK_BYTES. The
+    last PREVIEW_OPEN_DOCS documents stay open between requests. Opening
+    and rendering happen under the module-wide MuPDF lock.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        self._docs = OrderedDict()
+
+    def doc_path(self, digest):
+        return os.path.join(self.config['UPLOAD_FOLDER'], f"preview_{digest}.pdf")
+
+    @staticmethod
+    def valid_digest(digest):
+        return len(digest) == 64 and all(c in '0123456789abcdef' for c in digest)
+
+    def claim(self, digest):
+        """Copy a previewed document to a new ingested upload path.
+
+        A copy, because the tool consumes its input (organize may even
+        update it in place) while the preview stays in use.
+        """
+        if not self.valid_digest(digest) or not os.path.exists(self.doc_path(digest)):
+            raise ValueError("Preview not found, please upload the file again")
+        path = f"uploads/temp_{uuid.uuid4().hex}.pdf"
+        shutil.copyfile(self.doc_path(digest), path)
+        os.utime(self.doc_path(digest))
+        return path
+
+    def add(self, path):
+        """Adopt an ingested upload; returns its digest and first page size."""
+        digest = file_sha256(path)
+        target = self.doc_path(digest)
+        if os.path.exists(target):
+            os.remove(path)
+            os.utime(target)
+        else:
+            os.replace(path, target)
+        with _mupdf_lock:
+            doc = self._open(digest)
+            if not len(doc):
+                raise ValueError("The PDF has no pages")
+            rect = doc[0].rect
+            return digest, len(doc), rect.width, rect.height
+
+    def _open(self, digest):
+        # Caller holds _mupdf_lock
+        doc = self._docs.pop(digest, None)
+        if doc is None:
+            doc = fitz.open(self.doc_path(digest))
+            while len(self._docs) >= self.config['PREVIEW_OPEN_DOCS']:
+                self._docs.popitem(last=False)[1].close()
+        self._docs[digest] = doc
+        return doc
+
+    def thumbnail(self, digest, page, width):
+        """JPEG bytes of a 1-based page scaled to width pixels, or narrower
+        for pages more than PREVIEW_MAX_ASPECT times as tall as wide.
+
+        Raises FileNotFoundError for unknown documents and IndexError for
+        pages out of range.
+        """
+        key = f"{digest}_{page}_{width}"
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                metrics.inc("pdftoolz_previews_total", source="memory")
+                return data
+        disk_path = os.path.join(self.config['PREVIEW_FOLDER'], f"{key}.jpg")
+        try:
+            with open(disk_path, 'rb') as f:
+                data = f.read()
+            os.utime(disk_path)
+            source = "disk"
+        except FileNotFoundError:
+            data = self._render(digest, page, width)
+            # Concurrent misses for one thumbnail each write their own file
+            tmp_path = f"{disk_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, disk_path)
+            self._account_disk(len(data))
+            source = "render"
+        metrics.inc("pdftoolz_previews_total", source=source)
+        with self._lock:
+            if key not in self._memory:
+                self._memory[key] = data
+                self._memory_bytes += len(data)
+            while self._memory_bytes > self.config['PREVIEW_MEMORY_BYTES']:
+                self._memory_bytes -= len(self._memory.popitem(last=False)[1])
+        return data
+
+    def _render(self, digest, page, width):
+        with _mupdf_lock:
+            try:
+                doc = self._open(digest)
+            except fitz.FileNotFoundError:
+                raise FileNotFoundError(digest)
+            # Looking at the pages counts as using the document
+            os.utime(self.doc_path(digest))
+            if not 1 <= page <= len(doc):
+                raise IndexError(page)
+            fitz_page = doc[page - 1]
+            rect = fitz_page.rect
+            zoom = min(width / rect.width, self.config['PREVIEW_MAX_ASPECT'] * width / rect.height)
+            pix = fitz_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            return pix.tobytes("jpeg", jpg_quality=80)
+
+    def _account_disk(self, added):
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(self.config['PREVIEW_FOLDER']))
+            else:
+                self._disk_bytes += added
+            if self._disk_bytes <= self.config['PREVIEW_DISK_BYTES']:
+                return
+            # Evict least recently used down to 90% so this doesn't run on every miss
+            entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                             for entry in os.scandir(self.config['PREVIEW_FOLDER']))
+            self._disk_bytes = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if self._disk_bytes <= 0.9 * self.config['PREVIEW_DISK_BYTES']:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self._disk_bytes -= size
+
+previews = PreviewCache(app.config)
+
+# --- Chunked uploads -------------------------------------------------------------
+
+class ChunkedUploads:
+    """Resumable uploads assembled from numbered, checksummed chunks.
+
+    Each upload is a file in uploads/ sized up front; chunk n is written at
+    n * UPLOAD_CHUNK_SIZE as it streams in, so chunks may arrive in any
+    order, in parallel, and be retried. A chunk only counts once its length
+    (and SHA-256, when the client sends one) checks out. A completed upload
+    is claimed once, by a tool request. Sessions live in memory, like jobs;
+    their files age out through the reaper like any other upload. At most
+    UPLOAD_MAX_SESSIONS are open at once, reserving UPLOAD_MAX_RESERVED_BYTES
+    between them.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def _path(self, upload_id):
+        return os.path.join(self.config['UPLOAD_FOLDER'], f"chunked_{upload_id}.part")
+
+    def _session(self, upload_id):
+        # Caller holds _lock
+        session = self._sessions.get(upload_id)
+        if session is None or not os.path.exists(self._path(upload_id)):
+            self._sessions.pop(upload_id, None)
+            raise KeyError(upload_id)
+        return session
+
+    def create(self, filename, size):
+        """Start a session; returns None when too many uploads are open."""
+        if not 0 < size <= self.config['MAX_CONTENT_LENGTH']:
+            raise ValueError("File size must be between 1 byte and the upload limit")
+        upload_id = uuid.uuid4().hex
+        chunk_size = self.config['UPLOAD_CHUNK_SIZE']
+        session = {
+            "id": upload_id,
+            "filename": filename,
+            "size": size,
+            "chunk_size": chunk_size,
+            "chunks": -(-size // chunk_size),
+            "received": set(),
+            "complete": False,
+            "updated": time.time(),
+        }
+        with self._lock:
+            self._prune()
+            reserved = sum(other['size'] for other in self._sessions.values())
+            if (len(self._sessions) >= self.config['UPLOAD_MAX_SESSIONS']
+                    or reserved + size > self.config['UPLOAD_MAX_RESERVED_BYTES']):
+                return None
+            with open(self._path(upload_id), 'wb') as f:
+                f.truncate(size)
+            self._sessions[upload_id] = session
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        with self._lock:
+            session = self._session(upload_id)
+            view = {k: v for k, v in session.items() if k not in ("received", "updated")}
+            view['received'] = sorted(session['received'])
+            return view
+
+    def write_chunk(self, upload_id, index, stream, checksum=None):
+        """Store chunk index from stream; returns the number of chunks received."""
+        with self._lock:
+            session = self._session(upload_id)
+            if session['complete']:
+                raise ValueError("Upload is already complete")
+            if not 0 <= index < session['chunks']:
+                raise ValueError(f"Chunk {index} is out of range")
+            # A retry overwrites the chunk, so it only counts again once it checks out
+            session['received'].discard(index)
+        offset = index * session['chunk_size']
+        expected = min(session['chunk_size'], session['size'] - offset)
+        digest = hashlib.sha256()
+        written = 0
+        with open(self._path(upload_id), 'r+b') as f:
+            f.seek(offset)
+            while written <= expected:
+                block = stream.read(min(1024 * 1024, expected + 1 - written))
+                if not block:
+                    break
+                written += len(block)
+                if written > expected:
+                    break
+                digest.update(block)
+                f.write(block)
+        if written != expected:
+            raise ValueError(f"Chunk {index} must be {expected} bytes")
+        if checksum and checksum.lower() != digest.hexdigest():
+            raise ValueError(f"Chunk {index} checksum mismatch")
+        with self._lock:
+            session['received'].add(index)
+            session['updated'] = time.time()
+            return len(session['received'])
+
+    def complete(self, upload_id):
+        with self._lock:
+            session = self._session(upload_id)
+            missing = session['chunks'] - len(session['received'])
+            if missing:
+                raise ValueError(f"{missing} chunks are still missing")
+            with open(self._path(upload_id), 'rb') as f:
+                if b'%PDF-' not in f.read(1024):
+                    raise ValueError(f"{session['filename']} is not a PDF file")
+            session['complete'] = True
+            session['updated'] = time.time()
+            return session['id']
+
+    def claim(self, upload_id):
+        """Hand a completed upload over to a tool as an ingested upload path."""
+        with self._lock:
+            try:
+                session = self._session(upload_id)
+            except KeyError:
+                raise ValueError("Upload not found, please upload the file again")
+            if not session['complete']:
+                raise ValueError(f"Upload of {session['filename']} is not complete")
+            del self._sessions[upload_id]
+            path = f"uploads/temp_{uuid.uuid4().hex}.pdf"
+            os.replace(self._path(upload_id), path)
+            return path
+
+    def _prune(self):
+        cutoff = time.time() - self.config['FILE_TTL']
+        for upload_id, session in list(self._sessions.items()):
+            if session['updated'] < cutoff:
+                del self._sessions[upload_id]
+                if os.path.exists(self._path(upload_id)):
+                    os.remove(self._path(upload_id))
+
+chunked_uploads = ChunkedUploads(app.config)
+
+def ingest_upload(file):
+    """Move an uploaded file into uploads/ and return its path.
+
+    Tools only ever get this path and open it themselves, so MuPDF,
+    pdfplumber and pdf2docx all read the document from disk on demand.
+    """
+    path = f"uploads/temp_{uuid.uuid4().hex}.pdf"
+    stream = file.stream
+    if getattr(stream, 'name', None) in request.spooled_files:
+        stream.close()
+        os.replace(stream.name, path)
+    else:
+        file.save(path, buffer_size=1024 * 1024)
+    with open(path, 'rb') as f:
+        head = f.read(1024)
+    if head and b'%PDF-' not in head:
+        os.remove(path)
+        raise ValueError(f"{file.filename} is not a PDF file")
+    return path
+
+@app.teardown_request
+def remove_spooled_uploads(exc):
+    # File parts that were never claimed by ingest_upload()
+    for name in getattr(request, 'spooled_files', ()):
+        if os.path.exists(name):
+            os.remove(name)
+
 @app.route('/')
 def index():
-    response = render_template_string(HTML, tools=TOOLS)
+    response = render_template_string(HTML, tools=TOOLS, chunk_threshold=app.config['CHUNKED_UPLOAD_THRESHOLD'])
     return response
 
 @app.route('/<tool_id>', methods=['POST'])
 def handle_tool(tool_id):
+    if tool_id not in TOOL_RUNNERS:
+        return jsonify(error="Unknown tool")
+    metrics.inc("pdftoolz_requests_total", tool=tool_id)
+    started = time.perf_counter()
+    paths = []
     try:
+        # Completed chunked uploads (upload=<id>) stand in for file parts,
+        # and a document sent to /preview (doc=<digest>) for the file
+        upload_ids = request.form.getlist('upload')
+        preview_doc = request.form.get('doc')
         if tool_id == "merge":
-            files = request.files.getlist('files')
-            if len(files) < 2: 
+            files = upload_ids or request.files.getlist('files')
+            if len(files) < 2:
                 return jsonify(error="Please select at least 2 PDF files to merge")
-            merger = fitz.open()
-            for file in files:
-                pdf_data = file.read()
-                if pdf_data:
-                    merger.insert_pdf(fitz.open("pdf", pdf_data))
-            output = f"merged_{uuid.uuid4().hex}.pdf"
-            merger.save(f"downloads/{output}")
-            merger.close()
-            return jsonify(url=f"/download/{output}")
-
-        elif tool_id == "compress":
-            file = request.files.get('file')
-            if not file:
-                return jsonify(error="No file uploaded")
-            doc = fitz.open("pdf", file.read())
-            output = f"compressed_{uuid.uuid4().hex}.pdf"
-            doc.save(f"downloads/{output}", garbage=4, deflate=True, clean=True)
-            doc.close()
-            return jsonify(url=f"/download/{output}")
-
-        elif tool_id == "word":
-            file = request.files.get('file')
+        elif preview_doc:
+            paths.append(previews.claim(preview_doc))
+            files = []
+        else:
+            file = upload_ids[0] if upload_ids else request.files.get('file')
             if not file:
                 return jsonify(error="No file uploaded")
-            path = f"uploads/temp_{uuid.uuid4().hex}.pdf"
-            file.save(path)
-            out = f"word_{uuid.uuid4().hex}.docx"
-            cv = Converter(path)
-            cv.convert(f"downloads/{out}")
-            cv.close()
+            files = [file]
+        for file in files:
+            paths.append(chunked_uploads.claim(file) if upload_ids else ingest_upload(file))
+    except Exception as e:
+        for path in paths:
             os.remove(path)
-            return jsonify(url=f"/download/{out}")
+        metrics.inc("pdftoolz_errors_total", tool=tool_id, reason="upload")
+        return jsonify(error=str(e))
+    metrics.inc("pdftoolz_bytes_in_total", sum(os.path.getsize(path) for path in paths), tool=tool_id)
 
-        elif tool_id == "excel":
-            file = request.files.get('file')
-            if not file:
-                return jsonify(error="No file uploaded")
-            path = f"uploads/temp_{uuid.uuid4().hex}.pdf"
-            file.save(path)
-            out = f"excel_{uuid.uuid4().hex}.xlsx"
-            tables_found = False
-            with pdfplumber.open(path) as pdf:
-                with pd.ExcelWriter(f"downloads/{out}") as writer:
-                    for i, page in enumerate(pdf.pages):
-                        tables = page.extract_tables()
-                        if tables:
-                            tables_found = True
-                            for j, table in enumerate(tables):
-                                df = pd.DataFrame(table)
-                                df.to_excel(writer, sheet_name=f"P{i+1}_T{j+1}", index=False)
-                    if not tables_found:
-                        # Create empty sheet if no tables found
-                        pd.DataFrame({"Note": ["No tables found in this PDF"]}).to_excel(writer, sheet_name="Info", index=False)
-            os.remove(path)
-            return jsonify(url=f"/download/{out}")
+    options = request.form.to_dict()
+    options.pop('upload', None)
+    options.pop('doc', None)
+    if tool_id == "split" and options.get('stream') == '1':
+        try:
+            return stream_split(paths[0], options)
+        except Exception as e:
+            metrics.inc("pdftoolz_errors_total", tool=tool_id, reason="job")
+            return jsonify(error=str(e))
 
-        elif tool_id == "ppt":
-            file = request.files.get('file')
-            if not file:
-                return jsonify(error="No file uploaded")
-            path = f"uploads/temp_{uuid.uuid4().hex}.pdf"
-            file.save(path)
-            prs = Presentation()
-            doc = fitz.open(path)
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                img = io.BytesIO(pix.tobytes("png"))
-                slide = prs.slides.add_slide(prs.slide_layouts[6])
-                slide.shapes.add_picture(img, Inches(0), Inches(0), width=Inches(10))
-            out = f"ppt_{uuid.uuid4().hex}.pptx"
-            prs.save(f"downloads/{out}")
-            doc.close()
-            os.remove(path)
-            return jsonify(url=f"/download/{out}")
+    cache_key = None
+    if app.config['RESULT_CACHE_ENABLED']:
+        cache_key = result_cache.key(tool_id, [file_sha256(path) for path in paths], options)
+    ingest_seconds = time.perf_counter() - started
+    metrics.observe("pdftoolz_stage_seconds", ingest_seconds, tool=tool_id, stage="ingest")
+    trace = {"ingest": ingest_seconds} if request.headers.get('X-PDFToolz-Trace') else None
+    profile = app.config['PROFILING_ENABLED'] and bool(request.headers.get('X-PDFToolz-Profile'))
 
-        elif tool_id == "split":
-            file = request.files.get('file')
-            if not file:
-                return jsonify(error="No file uploaded")
-            path = f"uploads/temp_{uuid.uuid4().hex}.pdf"
-            file.save(path)
-            doc = fitz.open(path)
-            zip_path = f"downloads/split_{uuid.uuid4().hex}.zip"
-            with zipfile.ZipFile(zip_path, 'w') as zf:
-                for i in range(len(doc)):
-                    new_doc = fitz.open()
-                    new_doc.insert_pdf(doc, from_page=i, to_page=i)
-                    buf = io.BytesIO()
-                    new_doc.save(buf)
-                    zf.writestr(f"page_{i+1}.pdf", buf.getvalue())
-                    new_doc.close()
-            doc.close()
+    if cache_key:
+        result = result_cache.get(cache_key)
+        if result is not None:
+            for path in paths:
+                os.remove(path)
+            return jsonify(status="done", cached=True, result=result, url=f"/download/{result['file']}", trace=trace)
+
+    return queue_job(tool_id, paths, options, cache_key, trace, profile)
+
+def queue_job(tool_id, paths, options, cache_key=None, trace=None, profile=False):
+    """Submit a job and answer 202 with its status URL, or 429 when busy."""
+    job = jobs.submit(tool_id, paths, options, cache_key, trace, profile)
+    if job is None:
+        for path in paths:
             os.remove(path)
-            return jsonify(url=f"/download/{os.path.basename(zip_path)}")
+        metrics.inc("pdftoolz_errors_total", tool=tool_id, reason="queue_full")
+        response = jsonify(error="Server is busy, please try again in a moment")
+        response.headers['Retry-After'] = '5'
+        return response, 429
+    return jsonify(job=job['id'], status_url=f"/jobs/{job['id']}"), 202
 
-        elif tool_id == "organize":
-            file = request.files.get('file')
-            if not file:
-                return jsonify(error="No file uploaded")
-            order = request.form.get('order', '')
-            path = f"uploads/temp_{uuid.uuid4().hex}.pdf"
-            file.save(path)
-            doc = fitz.open(path)
-            
-            if order.strip():
-                indices = [int(x.strip())-1 for x in order.split(',') if x.strip().isdigit()]
-                valid_indices = [i for i in indices if 0 <= i < len(doc)]
-                if valid_indices:
-                    doc.select(valid_indices)
-            
-            out = f"organized_{uuid.uuid4().hex}.pdf"
-            doc.save(f"downloads/{out}")
-            doc.close()
+def unpack_zip_upload(file, limit):
+    """Extract the PDFs of an uploaded ZIP into uploads/.
+
+    Returns (name, path) for each PDF and (name, error) for each entry that
+    is not one. Stops with ValueError past limit PDFs or BATCH_MAX_BYTES of
+    extracted data, so a small archive cannot fill the disk.
+    """
+    archive = f"uploads/temp_{uuid.uuid4().hex}.zip"
+    file.save(archive, buffer_size=1024 * 1024)
+    accepted, rejected = [], []
+    budget = app.config['BATCH_MAX_BYTES']
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                name = info.filename
+                if info.is_dir() or name.startswith('__MACOSX/'):
+                    continue
+                if not name.lower().endswith('.pdf'):
+                    rejected.append((name, "Not a PDF file"))
+                    continue
+                if len(accepted) >= limit:
+                    raise ValueError(f"A batch takes at most {app.config['BATCH_MAX_FILES']} files")
+                budget -= info.file_size
+                if budget < 0:
+                    raise ValueError("ZIP contents are too large")
+                path = f"uploads/temp_{uuid.uuid4().hex}.pdf"
+                with zf.open(info) as src, open(path, 'wb') as dst:
+                    # file_size comes from the archive, so cap what is really written
+                    copied = 0
+                    while chunk := src.read(1024 * 1024):
+                        copied += len(chunk)
+                        if copied > info.file_size:
+                            break
+                        dst.write(chunk)
+                with open(path, 'rb') as f:
+                    head = f.read(1024)
+                if copied > info.file_size or b'%PDF-' not in head:
+                    os.remove(path)
+                    rejected.append((name, "Not a PDF file"))
+                else:
+                    accepted.append((name, path))
+    except (zipfile.BadZipFile, ValueError) as e:
+        for _, path in accepted:
             os.remove(path)
-            return jsonify(url=f"/download/{out}")
+        raise ValueError(f"{file.filename}: {e}")
+    finally:
+        os.remove(archive)
+    return accepted, rejected
 
-        else:
-            return jsonify(error="Unknown tool")
+@app.route('/batch/<tool_id>', methods=['POST'])
+def handle_batch(tool_id):
+    """Run one tool over many PDFs, uploaded as files and/or ZIP archives.
 
+    Answers like a single tool call; the job's output is a ZIP of every
+    result plus manifest.json with each file's status.
+    """
+    if tool_id not in TOOL_RUNNERS or tool_id == "merge":
+        return jsonify(error="Unknown tool")
+    metrics.inc("pdftoolz_requests_total", tool="batch")
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify(error="No file uploaded")
+    accepted, rejected = [], []
+    try:
+        for file in files:
+            limit = app.config['BATCH_MAX_FILES'] - len(accepted)
+            if file.filename.lower().endswith('.zip'):
+                unpacked, skipped = unpack_zip_upload(file, limit)
+                accepted.extend(unpacked)
+                rejected.extend(skipped)
+            elif limit <= 0:
+                raise ValueError(f"A batch takes at most {app.config['BATCH_MAX_FILES']} files")
+            else:
+                try:
+                    accepted.append((file.filename, ingest_upload(file)))
+                except ValueError as e:
+                    rejected.append((file.filename, str(e)))
     except Exception as e:
+        for _, path in accepted:
+            os.remove(path)
+        metrics.inc("pdftoolz_errors_total", tool="batch", reason="upload")
         return jsonify(error=str(e))
+    if not accepted:
+        return jsonify(error="No PDF files found in the upload")
+    paths = [path for _, path in accepted]
+    metrics.inc("pdftoolz_bytes_in_total", sum(os.path.getsize(path) for path in paths), tool="batch")
+    options = {
+        "tool": tool_id,
+        "names": [name for name, _ in accepted],
+        "rejected": rejected,
+        "options": request.form.to_dict(),
+    }
+    return queue_job("batch", paths, options)
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    if job['status'] == 'done':
+        return jsonify(url=job['url'])
+    if job['status'] == 'failed':
+        return jsonify(error=job['error'])
+    return jsonify(status=job['status'], progress=job['progress']), 202
+
+@app.route('/jobs/<job_id>/profile')
+def job_profile(job_id):
+    folded = jobs.profile(job_id)
+    if folded is None:
+        return jsonify(error="No profile for this job"), 404
+    return Response(folded, mimetype='text/plain')
+
+@app.route('/metrics')
+def metrics_endpoint():
+    for state, count in jobs.counts().items():
+        metrics.set("pdftoolz_jobs", count, state=state)
+    metrics.set("pdftoolz_cache_lookups_total", result_cache.hits, result="hit")
+    metrics.set("pdftoolz_cache_lookups_total", result_cache.misses, result="miss")
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(result_cache.stats())
 
 @app.route('/download/<filename>')
 def download(filename):
+    """Serve an output, or hand it to the front-end server to serve.
+
+    send_file answers Range, If-None-Match and If-Modified-Since requests
+    itself, and under gunicorn the body goes out with sendfile(). With
+    X_ACCEL_REDIRECT_PREFIX set, nginx serves the file (ranges and
+    validators included) and no Python thread touches the body; the same
+    goes for Apache/lighttpd with USE_X_SENDFILE. The front-end server only
+    opens the file after this returns, so offloaded downloads are never
+    deleted here: ?delete=1 is refused and DELETE_AFTER_DOWNLOAD is ignored,
+    leaving the file to the reaper.
+    """
     filepath = f"downloads/{filename}"
-    if os.path.exists(filepath):
-        return send_file(filepath, as_attachment=True)
-    return jsonify(error="File not found"), 404
+    if not os.path.isfile(filepath):
+        return jsonify(error="File not found"), 404
+    prefix = app.config['X_ACCEL_REDIRECT_PREFIX']
+    offloaded = bool(prefix) or app.config['USE_X_SENDFILE']
+    if offloaded and request.args.get('delete') == '1':
+        return jsonify(error="Deleting files on download is not available on this server"), 400
+    if prefix:
+        if request.method == 'GET':
+            metrics.inc("pdftoolz_download_bytes_total", os.path.getsize(filepath))
+        response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers.set('Content-Disposition', 'attachment', filename=filename)
+        response.headers['X-Accel-Redirect'] = f"{prefix.rstrip('/')}/{filename}"
+        return response
+    # Absolute, or Flask resolves it against the app's folder, not the cwd
+    response = send_file(os.path.abspath(filepath), as_attachment=True, conditional=True, etag=True)
+    if request.method != 'GET':
+        return response
+    if offloaded:
+        # X-Sendfile: the body comes from the front-end server, ranges included
+        if response.status_code == 200:
+            metrics.inc("pdftoolz_download_bytes_total", os.path.getsize(filepath))
+        return response
+    # Only bodies sent count: 206 sends the range, 304 nothing
+    if response.status_code in (200, 206):
+        metrics.inc("pdftoolz_download_bytes_total", response.content_length or 0)
+    # Range, conditional and HEAD requests leave the file for the rest of the
+    # download or a later revalidation; only a full body consumes it
+    if response.status_code == 200 and (app.config['DELETE_AFTER_DOWNLOAD'] or request.args.get('delete') == '1'):
+        # send_file has already opened the file, so the response still
+        # streams it in full after the directory entry is gone
+        os.remove(filepath)
+    return response
+
+@app.route('/uploads', methods=['POST'])
+def upload_init():
+    """Start a chunked upload from JSON {"filename", "size"}.
+
+    The reply gives the upload id, chunk size and chunk count. Then PUT each
+    chunk to /uploads/<id>/<n> (optionally with X-Chunk-SHA256), POST to
+    /uploads/<id>/complete, and send upload=<id> to a tool instead of a file.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        session = chunked_uploads.create(secure_filename(str(data.get('filename', ''))) or "upload.pdf", int(data.get('size', 0)))
+    except (TypeError, ValueError) as e:
+        return jsonify(error=str(e)), 400
+    if session is None:
+        response = jsonify(error="Server is busy, please try again in a moment")
+        response.headers['Retry-After'] = '60'
+        return response, 429
+    return jsonify(session), 201
+
+@app.route('/uploads/<upload_id>')
+def upload_status(upload_id):
+    # Lists the chunks received so far, for resuming
+    try:
+        return jsonify(chunked_uploads.status(upload_id))
+    except KeyError:
+        return jsonify(error="Upload not found"), 404
+
+@app.route('/uploads/<upload_id>/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    try:
+        received = chunked_uploads.write_chunk(upload_id, index, request.stream, request.headers.get('X-Chunk-SHA256'))
+    except KeyError:
+        return jsonify(error="Upload not found"), 404
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(received=received)
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def upload_complete(upload_id):
+    try:
+        return jsonify(upload=chunked_uploads.complete(upload_id))
+    except KeyError:
+        return jsonify(error="Upload not found"), 404
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+@app.route('/preview', methods=['POST'])
+def preview_upload():
+    # A completed chunked upload (upload=<id>) stands in for the file part
+    upload_id = request.form.get('upload')
+    file = request.files.get('file')
+    if not file and not upload_id:
+        return jsonify(error="No file uploaded")
+    try:
+        digest, pages, width, height = previews.add(chunked_uploads.claim(upload_id) if upload_id else ingest_upload(file))
+    except Exception as e:
+        return jsonify(error=str(e))
+    return jsonify(doc=digest, pages=pages, width=width, height=height)
+
+@app.route('/preview/<doc>/<int:page>')
+def preview_page(doc, page):
+    """Thumbnail of one page; ?width= is rounded up to a multiple of 40px."""
+    if not PreviewCache.valid_digest(doc):
+        return jsonify(error="Document not found"), 404
+    width = -(-int_option(request.args, 'width', 160, 40, 800) // 40) * 40
+    try:
+        data = previews.thumbnail(doc, page, width)
+    except FileNotFoundError:
+        return jsonify(error="Document not found"), 404
+    except IndexError:
+        return jsonify(error="Page not found"), 404
+    response = Response(data, mimetype='image/jpeg')
+    response.cache_control.private = True
+    response.cache_control.max_age = 3600
+    return response
 
 @app.route('/favicon.ico')
 def favicon():
     return '', 204
 
 if __name__ == '__main__':
-    print("PDFToolz started at http://0.0.0.0:5000")
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    # Development server; for production run: gunicorn -c gunicorn_conf.py pdftoolz:app
+    port = int(os.environ.get('PDFTOOLZ_PORT', 5000))
+    print(f"PDFToolz started at http://0.0.0.0:{port}")
+    app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pdftoolz creates uploads/, downloads/ and cache/ in the working directory
+# on import, so keep them out of the checkout
+os.chdir(tempfile.mkdtemp(prefix="pdftoolz-tests-"))
@@ -0,0 +1,114 @@
+import pytest
+
+from pdftoolz import _page_runs, organize_plan, parse_page_ops, parse_page_ranges, split_parts
+
+
+class TestParsePageRanges:
+    def test_empty_spec_selects_every_page(self):
+        assert parse_page_ranges("", 3) == [0, 1, 2]
+        assert parse_page_ranges("  ", 3) == [0, 1, 2]
+
+    def test_pages_and_ranges(self):
+        assert parse_page_ranges("1-3,5, 2", 5) == [0, 1, 2, 4, 1]
+
+    def test_backwards_range(self):
+        assert parse_page_ranges("5-3", 5) == [4, 3, 2]
+
+    def test_open_ended_range(self):
+        assert parse_page_ranges("3-", 5) == [2, 3, 4]
+
+    def test_open_ended_range_past_the_end_selects_nothing(self):
+        assert parse_page_ranges("7-", 5) == []
+        assert parse_page_ranges("5-", 5) == [4]
+
+    def test_pages_past_the_end_are_skipped(self):
+        assert parse_page_ranges("4-8,9", 5) == [3, 4]
+        assert parse_page_ranges("8-4", 5) == [4, 3]
+
+    @pytest.mark.parametrize("spec", ["0", "a", "1-b", "-3", "2-0"])
+    def test_invalid(self, spec):
+        with pytest.raises(ValueError):
+            parse_page_ranges(spec, 5)
+
+
+class TestParsePageOps:
+    def test_rotations(self):
+        assert parse_page_ops("3,1-2@90", 5) == [(2, 0), (0, 90), (1, 90)]
+
+    def test_rotation_without_pages_means_every_page(self):
+        assert parse_page_ops("@180", 3) == [(0, 180), (1, 180), (2, 180)]
+
+    def test_empty_items_are_ignored(self):
+        assert parse_page_ops("", 3) == []
+        assert parse_page_ops("1,,2", 3) == [(0, 0), (1, 0)]
+
+    @pytest.mark.parametrize("spec", ["1@x", "1@45"])
+    def test_invalid_rotation(self, spec):
+        with pytest.raises(ValueError):
+            parse_page_ops(spec, 3)
+
+
+class TestOrganizePlan:
+    def test_no_options_keeps_the_document(self):
+        assert organize_plan({}, 3) == [(0, 0), (1, 0), (2, 0)]
+
+    def test_order_duplicates_and_rotates(self):
+        assert organize_plan({"order": "2,1@90,1"}, 3) == [(1, 0), (0, 90), (0, 0)]
+
+    def test_rotate_adds_by_source_page(self):
+        plan = organize_plan({"order": "1@270,2,1", "rotate": "1@180"}, 2)
+        assert plan == [(0, 90), (1, 0), (0, 180)]
+
+    def test_delete_drops_every_copy(self):
+        assert organize_plan({"order": "1,2,1,3", "delete": "1"}, 3) == [(1, 0), (2, 0)]
+
+    def test_delete_past_the_end_deletes_nothing(self):
+        assert organize_plan({"delete": "7-"}, 5) == [(i, 0) for i in range(5)]
+
+    def test_order_selecting_nothing_is_an_error(self):
+        with pytest.raises(ValueError):
+            organize_plan({"order": "7-"}, 5)
+
+    def test_deleting_everything_is_an_error(self):
+        with pytest.raises(ValueError):
+            organize_plan({"delete": "1-"}, 3)
+
+
+class TestSplitParts:
+    def test_every_page_by_default(self):
+        assert split_parts({}, 3) == [("page_1.pdf", [0]), ("page_2.pdf", [1]), ("page_3.pdf", [2])]
+
+    def test_every(self):
+        assert split_parts({"every": "2"}, 5) == [
+            ("pages_1-2.pdf", [0, 1]), ("pages_3-4.pdf", [2, 3]), ("page_5.pdf", [4])]
+
+    def test_ranges(self):
+        assert split_parts({"ranges": "1-3,5"}, 5) == [("pages_1-3.pdf", [0, 1, 2]), ("page_5.pdf", [4])]
+
+    def test_ranges_past_the_end_make_no_part(self):
+        assert split_parts({"ranges": "1-3,7-"}, 5) == [("pages_1-3.pdf", [0, 1, 2])]
+
+    def test_repeated_ranges_get_distinct_names(self):
+        names = [name for name, _ in split_parts({"ranges": "2,2"}, 3)]
+        assert names == ["page_2.pdf", "page_2_.pdf"]
+
+    def test_nothing_selected_is_an_error(self):
+        with pytest.raises(ValueError):
+            split_parts({"ranges": "9"}, 5)
+
+
+class TestPageRuns:
+    def test_consecutive_pages_form_one_run(self):
+        assert _page_runs([0, 1, 2, 5, 6]) == [(0, 2), (5, 6)]
+
+    def test_descending_run(self):
+        assert _page_runs([4, 3, 2, 7]) == [(4, 2), (7, 7)]
+
+    def test_direction_change_starts_a_new_run(self):
+        assert _page_runs([0, 1, 2, 1, 0]) == [(0, 2), (1, 0)]
+
+    def test_repeated_page(self):
+        assert _page_runs([3, 3]) == [(3, 3), (3, 3)]
+
+    def test_empty(self):
+        assert _page_runs([]) == []